@@ -1,5 +1,6 @@
 #!/usr/bin/env python
 
 from .py_zap import Cable, Broadcast
+from .snapshot import DailySnapshot
 
-__all__ = ['Cable', 'Broadcast']
\ No newline at end of file
+__all__ = ['Cable', 'Broadcast', 'DailySnapshot']
\ No newline at end of file
@@ -0,0 +1,234 @@
+#!/usr/bin/env python
+
+import os
+import threading
+
+from .constants import DATE_FMT, PAGE_ERROR
+from .utils import PageNotFoundError, get_date_info, date_range
+from .urls import parse_url
+
+
+def get_codec(name=None):
+    """Return (name, compress, decompress) of a page codec.
+
+    :param name: 'zstd' or 'gzip'. Default - zstd if the zstandard package
+                 is installed, otherwise gzip.
+    """
+    if name in (None, 'zstd'):
+        try:
+            import zstandard
+        except ImportError:
+            if name == 'zstd':
+                raise
+        else:
+            return ('zstd', zstandard.ZstdCompressor().compress,
+                    zstandard.ZstdDecompressor().decompress)
+
+    if name not in (None, 'gzip'):
+        raise ValueError('%s is not a valid codec.' % name)
+
+    import gzip
+    return 'gzip', gzip.compress, gzip.decompress
+
+
+def lock_file(f):
+    """Hold an exclusive lock on an open file until it is closed.
+    Without fcntl (e.g. on Windows) only one process may write an archive.
+    """
+    try:
+        import fcntl
+    except ImportError:
+        return
+    fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+
+
+class PageArchive(object):
+    """Append-only pack of compressed pages.
+
+    Pages are appended to the pack file and never rewritten. The index file
+    next to it has one JSON line per page with its offset, so the pack is
+    read through a memory map without opening a file per page. A page added
+    again for the same url replaces the older copy in the index.
+
+    The archive can be used as the page cache (see utils.set_page_cache) to
+    keep every downloaded ratings page. Appends hold an exclusive lock on the
+    pack file, so several processes on one host can add pages to the same
+    archive. Each sees the pages of the others once it is opened again.
+    """
+
+    def __init__(self, path, codec=None):
+        """
+        :param path: The pack file. The index is kept at path + '.idx'.
+        :param codec: 'zstd' or 'gzip' for new pages. See get_codec.
+        """
+        self.path = path
+        self.index_path = path + '.idx'
+        self.codec = get_codec(codec)[0]
+
+        self._lock = threading.Lock()
+        self._pages = {}
+        self._dates = {}
+        self._map = None
+        self._map_size = 0
+
+        directory = os.path.dirname(os.path.abspath(path))
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self._read_index()
+
+    def _read_index(self):
+        """Load the index, skipping pages the pack does not fully hold,
+        e.g. after an interrupted write.
+        """
+        import json
+
+        size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        if not os.path.exists(self.index_path):
+            return
+
+        with open(self.index_path, 'r') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record['offset'] + record['length'] <= size:
+                    self._index(record)
+
+    def _index(self, record):
+        self._pages[record['url']] = record
+        if record.get('category') and record.get('date'):
+            self._dates[(record['category'], record['date'])] = record['url']
+
+    def add(self, url, content, category=None, date=None):
+        """Append a page to the archive.
+
+        :param content: The page HTML as bytes or a string.
+        :param category: cable, final, or tv. Default - read from the url.
+        :param date: The date of the page. Default - read from the url.
+        """
+        import json
+
+        if isinstance(content, str):
+            content = content.encode('utf-8')
+        if category is None or date is None:
+            category, date = parse_url(url) or (category, date)
+        if date is not None:
+            date = get_date_info(date)[1].strftime(DATE_FMT)
+
+        name, compress, _ = get_codec(self.codec)
+        blob = compress(content)
+
+        with self._lock:
+            with open(self.path, 'ab') as f:
+                # Other processes may append too. The offset is only known
+                # once the lock is held, and the index line is written under
+                # the same lock.
+                lock_file(f)
+                f.seek(0, os.SEEK_END)
+                offset = f.tell()
+                f.write(blob)
+                f.flush()
+
+                record = {'url': url, 'category': category, 'date': date,
+                          'offset': offset, 'length': len(blob), 'codec': name}
+                with open(self.index_path, 'a') as index:
+                    index.write(json.dumps(record, sort_keys=True) + '\n')
+            self._index(record)
+
+    def set(self, url, content):
+        """Archive a downloaded page, the same as PageCache.set."""
+        self.add(url, content)
+
+    def get(self, url):
+        """Return the archived page of a url as bytes, or None."""
+        with self._lock:
+            record = self._pages.get(url)
+            if record is None:
+                return None
+            blob = self._read(record['offset'], record['length'])
+        try:
+            return get_codec(record['codec'])[2](blob)
+        finally:
+            blob.release()
+
+    def _read(self, offset, length):
+        """Return a view of a compressed page in the memory mapped pack,
+        without copying it. The caller releases the view.
+        """
+        import mmap
+
+        end = offset + length
+        if end > self._map_size:
+            # The pack grew since it was mapped. The old map is not closed,
+            # other threads may still read through views of it; it is
+            # unmapped once the last view is released.
+            with open(self.path, 'rb') as f:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._map_size = len(self._map)
+        return memoryview(self._map)[offset:end]
+
+    def urls(self):
+        """Return the url of every archived page."""
+        with self._lock:
+            return list(self._pages)
+
+    def find(self, category, date):
+        """Return the url of the archived page of a category and date, or None."""
+        date = get_date_info(date)[1].strftime(DATE_FMT)
+        with self._lock:
+            return self._dates.get((category, date))
+
+    def get_page(self, category, date):
+        """Return the archived page of a category and date as bytes, or None."""
+        url = self.find(category, date)
+        return None if url is None else self.get(url)
+
+    def ratings(self, category, date, **kwargs):
+        """Parse an archived page into a Cable or Broadcast object.
+        Raises PageNotFoundError if the page is not archived.
+
+        :param kwargs: show, network, limit and retain, see ratings_from_html.
+        """
+        from .py_zap import ratings_from_html
+
+        url = self.find(category, date)
+        html = None if url is None else self.get(url)
+        if html is None:
+            raise PageNotFoundError(PAGE_ERROR)
+        return ratings_from_html(category, html, date, url=url, **kwargs)
+
+    def iter_ratings(self, category, start, end=None, **kwargs):
+        """Yield the ratings of every archived day from start to end.
+        Days missing from the archive are skipped.
+        """
+        for date in date_range(start, end or start):
+            if self.find(category, date) is not None:
+                yield self.ratings(category, date, **kwargs)
+
+    def dates(self, category):
+        """Return the archived dates of a category in date order."""
+        with self._lock:
+            dates = [date for key, date in self._dates if key == category]
+        return sorted(dates, key=lambda date: get_date_info(date)[1])
+
+    def close(self):
+        with self._lock:
+            if self._map is not None:
+                self._map.close()
+            self._map = None
+            self._map_size = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __contains__(self, url):
+        with self._lock:
+            return url in self._pages
+
+    def __len__(self):
+        with self._lock:
+            return len(self._pages)
@@ -0,0 +1,274 @@
+#!/usr/bin/env python
+
+'''
+Resumable backfill of ratings charts over a range of days.
+
+The days and categories to fetch are tasks in a SQLite file. Any number of
+worker threads or processes claim tasks from the same file, so a crashed
+backfill continues where it stopped:
+
+    queue = BackfillQueue('backfill.db')
+    queue.add(['cable', 'final'], 'January 1 2008', 'December 31 2017')
+    run_worker(queue)
+'''
+
+import os
+import socket
+import time
+from collections import namedtuple
+
+from .constants import (DATE_FMT, BACKFILL_LEASE, BACKFILL_RETRIES, BACKFILL_BACKOFF,
+                        BACKFILL_WINDOW)
+from .utils import get_date_info, date_range
+
+# A claimed chart to fetch
+Task = namedtuple('Task', ['category', 'date', 'attempts'])
+
+# Task counts by status, with the recent completion rate in tasks per second
+# and the estimated seconds left (None while no task was done recently)
+Progress = namedtuple('Progress', ['total', 'done', 'failed', 'pending',
+                                   'running', 'rate', 'eta'])
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS tasks (
+    category TEXT NOT NULL,
+    date TEXT NOT NULL,
+    day INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    not_before REAL NOT NULL DEFAULT 0,
+    worker TEXT,
+    claimed_at REAL,
+    finished_at REAL,
+    entries INTEGER,
+    error TEXT,
+    PRIMARY KEY (category, date)
+);
+CREATE INDEX IF NOT EXISTS tasks_status ON tasks (status, not_before, day);
+'''
+
+
+def get_worker_name():
+    """Return a name telling apart the workers of every host and process."""
+    return '{0}:{1}'.format(socket.gethostname(), os.getpid())
+
+
+class BackfillQueue(object):
+    """Queue of (category, date) tasks kept in a SQLite file.
+
+    Completed tasks are the checkpoint of the backfill. A claimed task that
+    is not completed or failed within the lease, e.g. because its worker
+    crashed, is claimed again. Failed tasks are retried with exponential
+    backoff until they run out of attempts.
+    """
+
+    def __init__(self, path, lease=BACKFILL_LEASE, retries=BACKFILL_RETRIES,
+                 backoff=BACKFILL_BACKOFF, window=BACKFILL_WINDOW):
+        """
+        :param path: The SQLite file, created if missing.
+        :param lease: Seconds a claimed task is reserved for its worker.
+        :param retries: Attempts of a task before it is marked failed.
+        :param backoff: Seconds before the first retry, doubled after each.
+        :param window: The completion rate is measured over the tasks
+                       finished in the last this many seconds.
+        """
+        self.path = path
+        self.lease = lease
+        self.retries = retries
+        self.backoff = backoff
+        self.window = window
+
+        with self._connect() as db:
+            db.executescript(SCHEMA)
+
+    def _connect(self):
+        """Open a connection. Each call gets its own so threads and
+        processes can share the file.
+        """
+        import sqlite3
+        from contextlib import closing
+
+        db = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        return closing(db)
+
+    def add(self, categories, start, end=None):
+        """Add a task for each category and day from start to end.
+        Tasks that already exist are left as they are.
+        Returns the number of tasks added.
+
+        :param categories: cable, final, or tv, or a list of them.
+        """
+        if isinstance(categories, str):
+            categories = [categories]
+
+        rows = []
+        for date in date_range(start, end or start):
+            date_obj = get_date_info(date)[1]
+            for category in categories:
+                rows.append((category, date_obj.strftime(DATE_FMT), date_obj.toordinal()))
+
+        with self._connect() as db:
+            db.execute('BEGIN IMMEDIATE')
+            before = db.total_changes
+            db.executemany('INSERT OR IGNORE INTO tasks (category, date, day) '
+                           'VALUES (?, ?, ?)', rows)
+            added = db.total_changes - before
+            db.execute('COMMIT')
+        return added
+
+    def claim(self, worker=None):
+        """Claim the earliest task that is due, or return None if no task is
+        due right now. Tasks whose lease expired after their last attempt,
+        e.g. because they keep crashing their worker, are marked failed.
+        """
+        now = time.time()
+        with self._connect() as db:
+            db.execute('BEGIN IMMEDIATE')
+            db.execute(
+                "UPDATE tasks SET status = 'failed', not_before = 0, "
+                "error = 'lease expired' WHERE status = 'running' "
+                "AND claimed_at <= ? AND attempts >= ?", (now - self.lease, self.retries))
+            row = db.execute(
+                "SELECT category, date, attempts FROM tasks "
+                "WHERE (status = 'pending' AND not_before <= ?) "
+                "OR (status = 'running' AND claimed_at <= ?) "
+                "ORDER BY day, category LIMIT 1", (now, now - self.lease)).fetchone()
+
+            if row is None:
+                db.execute('COMMIT')
+                return None
+
+            category, date, attempts = row
+            db.execute(
+                "UPDATE tasks SET status = 'running', attempts = ?, worker = ?, "
+                "claimed_at = ? WHERE category = ? AND date = ?",
+                (attempts + 1, worker or get_worker_name(), now, category, date))
+            db.execute('COMMIT')
+        return Task(category, date, attempts + 1)
+
+    def complete(self, task, entries=None):
+        """Checkpoint a finished task.
+
+        :param entries: Number of entries in the chart.
+        """
+        with self._connect() as db:
+            db.execute(
+                "UPDATE tasks SET status = 'done', finished_at = ?, entries = ?, "
+                "error = NULL WHERE category = ? AND date = ?",
+                (time.time(), entries, task.category, task.date))
+
+    def fail(self, task, error=None):
+        """Put a task back to be retried after the backoff, or mark it
+        failed once it ran out of attempts.
+        """
+        if task.attempts >= self.retries:
+            status, not_before = 'failed', 0
+        else:
+            status = 'pending'
+            not_before = time.time() + self.backoff * 2 ** (task.attempts - 1)
+
+        with self._connect() as db:
+            db.execute(
+                "UPDATE tasks SET status = ?, not_before = ?, error = ? "
+                "WHERE category = ? AND date = ?",
+                (status, not_before, error, task.category, task.date))
+
+    def retry_failed(self):
+        """Give every failed task a new set of attempts.
+        Returns the number of tasks reset.
+        """
+        with self._connect() as db:
+            cursor = db.execute(
+                "UPDATE tasks SET status = 'pending', attempts = 0, not_before = 0 "
+                "WHERE status = 'failed'")
+            return cursor.rowcount
+
+    def progress(self):
+        """Return the task counts, completion rate and estimated time left.
+
+        The rate only counts the tasks finished within the window, from the
+        earliest claim of those tasks, so time the backfill was stopped does
+        not slow it down.
+        """
+        now = time.time()
+        with self._connect() as db:
+            counts = dict(db.execute(
+                'SELECT status, COUNT(*) FROM tasks GROUP BY status').fetchall())
+            recent, first = db.execute(
+                "SELECT COUNT(*), MIN(claimed_at) FROM tasks "
+                "WHERE status = 'done' AND finished_at >= ?",
+                (now - self.window,)).fetchone()
+
+        done = counts.get('done', 0)
+        remaining = counts.get('pending', 0) + counts.get('running', 0)
+
+        rate = eta = None
+        if recent and now > first:
+            rate = recent / (now - max(first, now - self.window))
+            eta = remaining / rate
+        return Progress(sum(counts.values()), done, counts.get('failed', 0),
+                        counts.get('pending', 0), counts.get('running', 0), rate, eta)
+
+    def errors(self):
+        """Return (category, date, error) of every failed task."""
+        with self._connect() as db:
+            return db.execute(
+                "SELECT category, date, error FROM tasks WHERE status = 'failed' "
+                "ORDER BY day, category").fetchall()
+
+
+def fetch_task(task):
+    """Fetch the chart of a task as background work."""
+    from .py_zap import build_ratings
+    from .throttle import background
+
+    with background():
+        return build_ratings(task.category, task.date, retain='none')
+
+
+def run_worker(queue, worker=None, limit=None, index=None, wait=True):
+    """Claim and fetch tasks until none are left. Returns the number of
+    tasks completed.
+
+    :param worker: Name of the worker. Default - host name and process id.
+    :param limit: Stop after this many tasks.
+    :param index: A ShowIndex each fetched chart is ingested into.
+    :param wait: Wait for tasks backing off or claimed by other workers
+                 instead of stopping.
+    """
+    worker = worker or get_worker_name()
+    completed = 0
+
+    while limit is None or completed < limit:
+        task = queue.claim(worker)
+        if task is None:
+            progress = queue.progress()
+            if not wait or not (progress.pending or progress.running):
+                break
+            time.sleep(min(queue.backoff, 1.0))
+            continue
+
+        # Any error is retried, so one bad day or a full disk does not stop
+        # the worker with its task left running
+        try:
+            ratings = fetch_task(task)
+            if index is not None:
+                index.ingest(ratings)
+        except Exception as e:
+            queue.fail(task, repr(e))
+            continue
+
+        queue.complete(task, len(ratings.chart))
+        completed += 1
+
+    return completed
+
+
+def format_progress(progress):
+    """Format backfill progress as one line."""
+    s = '{0}/{1} done, {2} failed, {3} pending, {4} running'.format(
+        progress.done, progress.total, progress.failed, progress.pending,
+        progress.running)
+    if progress.rate is not None:
+        s += ', {0:.2f} charts/sec, ETA {1:.0f}s'.format(progress.rate, progress.eta)
+    return s
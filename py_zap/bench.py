@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+
+import time
+
+from .constants import RETENTION_POLICIES
+from .utils import parse_html
+from .py_zap import ratings_from_html
+
+# Stages of the pipeline, in the order they run
+STAGES = ['parse', 'verify', 'entries', 'filter', 'render', 'json']
+
+
+def time_stages(html, category, date, repeat=1):
+    """Time each pipeline stage on a recorded page.
+
+    Returns a dictionary of stage name to the list of timings in seconds.
+    'rows' has the number of chart rows (parsed or not) of each run.
+
+    :param html: The recorded page.
+    :param category: cable, final, or tv (non-final broadcast)
+    :param date: The date of the recorded page.
+    :param repeat: Number of times the pipeline is run.
+    """
+    timings = dict((stage, []) for stage in STAGES)
+    timings['rows'] = []
+    ratings = ratings_from_html(category, html, date)
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        ratings.soup = parse_html(html)
+        timings['parse'].append(time.perf_counter() - start)
+
+        # Forget the title and layout of the last run, so each run detects
+        # the template and reads the title the same way a fetch does
+        ratings._title = None
+        ratings.layout = None
+        start = time.perf_counter()
+        ratings._get_layout()
+        ratings._verify_page()
+        timings['verify'].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        ratings.chart = ratings.fetch_entries()
+        timings['entries'].append(time.perf_counter() - start)
+        timings['rows'].append(len(ratings.chart) + len(ratings.diagnostics))
+
+        start = time.perf_counter()
+        ratings.entries = ratings._filter_entries(ratings.chart)
+        timings['filter'].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        repr(ratings)
+        timings['render'].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        ratings.get_json()
+        timings['json'].append(time.perf_counter() - start)
+
+    return timings
+
+
+def measure_memory(html, category, date, retain):
+    """Return the bytes still allocated by a ratings object parsed from a
+    recorded page under a retention policy.
+
+    :param retain: 'soup', 'html' or 'none'
+    """
+    import gc
+    import tracemalloc
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        ratings = ratings_from_html(category, html, date, retain=retain)
+        gc.collect()
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+    del ratings
+    return after - before
+
+
+def format_memory(footprints):
+    """Format the footprint of each retention policy as a table in kilobytes."""
+    s = '|{:<10s}|{:>12s}|'.format('Retain', 'Footprint KB')
+    s += '\n+' + '-' * 23 + '+'
+
+    for policy in RETENTION_POLICIES:
+        if policy in footprints:
+            s += '\n|{:<10s}|{:>12.1f}|'.format(policy, footprints[policy] / 1024.0)
+    return s
+
+
+def format_timings(timings):
+    """Format stage timings as a table in milliseconds."""
+    s = '|{:<10s}|{:>8s}|{:>10s}|{:>10s}|'.format('Stage', 'Runs', 'Mean ms', 'Total ms')
+    s += '\n+' + '-' * 41 + '+'
+
+    for stage in STAGES:
+        values = timings.get(stage)
+        if not values:
+            continue
+        total = sum(values) * 1000
+        s += '\n|{:<10s}|{:>8d}|{:>10.3f}|{:>10.3f}|'.format(
+            stage, len(values), total / len(values), total)
+
+    rate = rows_per_second(timings)
+    if rate is not None:
+        s += '\n\nRow parsing: {:.0f} rows/sec'.format(rate)
+    return s
+
+
+def rows_per_second(timings):
+    """Return the row parsing throughput of the entries stage, or None."""
+    seconds = sum(timings.get('entries') or ())
+    rows = sum(timings.get('rows') or ())
+    if not seconds or not rows:
+        return None
+    return rows / seconds
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+
+import os
+import threading
+from collections import OrderedDict
+
+from .constants import CHART_CACHE_SIZE
+
+
+class ChartCache(object):
+    """Least recently used cache of parsed, unfiltered charts."""
+
+    def __init__(self, maxsize=CHART_CACHE_SIZE):
+        """
+        :param maxsize: Number of charts kept. None keeps every chart.
+        """
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._charts = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Return the cached chart for a key, or None."""
+        with self._lock:
+            chart = self._charts.get(key)
+            if chart is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._charts.move_to_end(key)
+            return chart
+
+    def set(self, key, chart):
+        """Cache a chart, dropping the least recently used one if full."""
+        with self._lock:
+            self._charts[key] = chart
+            self._charts.move_to_end(key)
+            if self.maxsize is not None:
+                while len(self._charts) > self.maxsize:
+                    self._charts.popitem(last=False)
+
+    def clear(self):
+        """Remove every cached chart."""
+        with self._lock:
+            self._charts.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._charts
+
+    def __len__(self):
+        with self._lock:
+            return len(self._charts)
+
+
+class PageCache(object):
+    """Directory of downloaded pages, stored gzipped and named by url hash."""
+
+    def __init__(self, directory):
+        """
+        :param directory: Where the pages are stored. Created if missing.
+        """
+        self.directory = directory
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def get_path(self, url):
+        """Return the file path of a cached url."""
+        import hashlib
+        name = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, name + '.html.gz')
+
+    def get(self, url):
+        """Return the cached page content as bytes, or None."""
+        import gzip
+        try:
+            with gzip.open(self.get_path(url), 'rb') as f:
+                return f.read()
+        except (IOError, OSError, EOFError):
+            return None
+
+    def set(self, url, content):
+        """Cache the page content of a url."""
+        import gzip
+        import tempfile
+
+        # Write to a temporary file first so readers never see partial pages
+        handle, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(handle, 'wb') as f:
+                f.write(gzip.compress(content))
+            os.replace(temp_path, self.get_path(url))
+        except Exception:
+            os.remove(temp_path)
+            raise
+
+    def __contains__(self, url):
+        return os.path.exists(self.get_path(url))
+
+
+# Charts shared by every Ratings object, keyed by (category, date)
+chart_cache = ChartCache()
@@ -0,0 +1,322 @@
+#!/usr/bin/env python
+
+'''
+Command-line tool for exporting ratings charts.
+
+    py-zap fetch --category cable --from 'July 1 2017' --to 'July 31 2017'
+    py-zap bench --category final --date 'July 25 2017' page.html
+    py-zap serve ratings.pack --latency 0.2 --error-rate 0.05
+    py-zap backfill queue.db --category cable final --from 'Jan 1 2008' --to 'Dec 31 2017'
+'''
+
+import argparse
+import sys
+
+from .constants import FLOAT_ATTRIBUTES, NONFLOAT_ATTRIBUTES, RATE_LIMIT, RATE_BURST
+from .utils import PageNotFoundError, date_range, get_date_info, set_page_cache
+
+CATEGORIES = ['cable', 'final', 'tv']
+FIELDS = ['category'] + NONFLOAT_ATTRIBUTES + FLOAT_ATTRIBUTES
+
+
+def fetch_day(category, date, show=None, network=None, limit=None):
+    """Fetch a chart as background work, keeping only its entries.
+    Returns None if it is not found.
+    """
+    from .py_zap import build_ratings
+    from .throttle import background
+
+    try:
+        with background():
+            return build_ratings(category, date, show=show, network=network,
+                                 limit=limit, retain='none')
+    except PageNotFoundError:
+        return None
+
+
+def entry_rows(ratings):
+    """Return the entries of a chart as dictionaries with the chart date."""
+    rows = []
+    for entry in ratings:
+        row = dict(entry.__dict__)
+        row['date'] = ratings.date
+        row['category'] = ratings.category
+        rows.append(row)
+    return rows
+
+
+class RowWriter(object):
+    """Writes entry rows as newline-delimited JSON or CSV."""
+
+    def __init__(self, stream, output_format):
+        self.stream = stream
+        self.output_format = output_format
+        self._csv = None
+
+    def write(self, rows):
+        if self.output_format == 'csv':
+            if self._csv is None:
+                import csv
+                self._csv = csv.DictWriter(self.stream, FIELDS, restval='',
+                                           extrasaction='ignore')
+                self._csv.writeheader()
+            self._csv.writerows(rows)
+        else:
+            import json
+            for row in rows:
+                self.stream.write(json.dumps(row, sort_keys=True) + '\n')
+        self.stream.flush()
+
+
+def run_fetch(args):
+    """Fetch every day and category, writing rows as each chart completes.
+    At most two tasks per worker are in flight, so a long range does not
+    hold every chart until the end.
+    """
+    from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+    from . import throttle
+
+    if args.cache:
+        from .cache import PageCache
+        set_page_cache(PageCache(args.cache))
+    elif args.archive:
+        from .archive import PageArchive
+        set_page_cache(PageArchive(args.archive))
+    if args.rate is not None or args.burst is not None:
+        rate = RATE_LIMIT if args.rate is None else args.rate
+        burst = RATE_BURST if args.burst is None else args.burst
+        throttle.configure(rate=rate, burst=burst)
+
+    start = get_date_info(args.start)[0]
+    end = get_date_info(args.end or args.start)[0]
+    tasks = [(category, date) for date in date_range(start, end)
+             for category in args.category]
+
+    writer = RowWriter(sys.stdout, args.format)
+    found = 0
+
+    pending = iter(tasks)
+    done = 0
+
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        futures = {}
+        while True:
+            for category, date in pending:
+                future = executor.submit(fetch_day, category, date, args.show,
+                                         args.network, args.limit)
+                futures[future] = (category, date)
+                if len(futures) >= args.workers * 2:
+                    break
+            if not futures:
+                break
+
+            for future in wait(futures, return_when=FIRST_COMPLETED)[0]:
+                category, date = futures.pop(future)
+                ratings = future.result()
+                done += 1
+
+                if ratings is not None:
+                    found += 1
+                    writer.write(entry_rows(ratings))
+
+                if args.progress:
+                    status = '%d entries' % len(ratings) if ratings is not None else 'not found'
+                    sys.stderr.write('[{0}/{1}] {2} {3}: {4}\n'.format(
+                        done, len(tasks), date, category, status))
+
+    return 0 if found else 1
+
+
+def run_bench(args):
+    """Time each pipeline stage on recorded pages."""
+    from .bench import STAGES, time_stages, format_timings
+
+    if args.memory:
+        return run_memory(args)
+
+    timings = dict((stage, []) for stage in STAGES)
+    for path in args.pages:
+        with open(path, 'rb') as f:
+            html = f.read()
+
+        page_timings = time_stages(html, args.category, args.date, repeat=args.repeat)
+        for stage, values in page_timings.items():
+            timings.setdefault(stage, []).extend(values)
+
+    print(format_timings(timings))
+    return 0
+
+
+def run_memory(args):
+    """Report the footprint of a parsed page under each retention policy."""
+    from .bench import measure_memory, format_memory
+    from .constants import RETENTION_POLICIES
+
+    footprints = dict((policy, 0) for policy in RETENTION_POLICIES)
+    for path in args.pages:
+        with open(path, 'rb') as f:
+            html = f.read()
+
+        for policy in RETENTION_POLICIES:
+            footprints[policy] += measure_memory(html, args.category, args.date, policy)
+
+    print(format_memory(footprints))
+    return 0
+
+
+def run_serve(args):
+    """Serve an archive of recorded pages until interrupted."""
+    import time
+    from .archive import PageArchive
+    from .server import StandInServer
+
+    server = StandInServer.from_archive(
+        PageArchive(args.archive), port=args.port, latency=args.latency,
+        jitter=args.jitter, error_rate=args.error_rate,
+        throughput=args.throughput, seed=args.seed)
+    server.start()
+    sys.stderr.write('Serving {0} pages at {1}\n'.format(len(server.pages), server.url))
+    sys.stderr.write('Fetch from it with PY_ZAP_BASE_URL={0}\n'.format(server.url))
+
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+    return 0
+
+
+def run_backfill(args):
+    """Add backfill tasks and work on the queue until no task is left."""
+    from concurrent.futures import ThreadPoolExecutor, wait
+    from .backfill import BackfillQueue, run_worker, format_progress, get_worker_name
+
+    queue = BackfillQueue(args.queue)
+    if args.start:
+        added = queue.add(args.category, args.start, args.end)
+        sys.stderr.write('Added {0} tasks\n'.format(added))
+    if args.retry_failed:
+        queue.retry_failed()
+    if args.status:
+        print(format_progress(queue.progress()))
+        return 0
+
+    if args.archive:
+        from .archive import PageArchive
+        set_page_cache(PageArchive(args.archive))
+    index = None
+    if args.index:
+        from .index import ShowIndex
+        index = ShowIndex(args.index)
+
+    name = get_worker_name()
+    crashed = 0
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        futures = [executor.submit(run_worker, queue, '{0}/{1}'.format(name, number),
+                                   index=index)
+                   for number in range(args.workers)]
+        while futures:
+            done, futures = wait(futures, timeout=args.interval)
+            for future in done:
+                if future.exception() is not None:
+                    crashed += 1
+                    sys.stderr.write('Worker stopped: {0!r}\n'.format(future.exception()))
+            if args.progress:
+                sys.stderr.write(format_progress(queue.progress()) + '\n')
+
+    progress = queue.progress()
+    sys.stderr.write(format_progress(progress) + '\n')
+    return 1 if progress.failed or crashed else 0
+
+
+def get_parser():
+    """Build the argument parser of the command-line tool."""
+    parser = argparse.ArgumentParser(
+        prog='py-zap', description='Fetch TV ratings from tvbythenumbers.zap2it.com')
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    fetch = commands.add_parser('fetch', help='export charts for a range of days')
+    fetch.add_argument('--category', nargs='+', choices=CATEGORIES, default=['final'],
+                       help='charts to fetch (default: final)')
+    fetch.add_argument('--from', dest='start', default=None,
+                       help="first date, e.g. 'July 1 2017' (default: yesterday)")
+    fetch.add_argument('--to', dest='end', default=None,
+                       help='last date (default: the first date)')
+    fetch.add_argument('--workers', type=int, default=4,
+                       help='charts fetched at the same time')
+    fetch.add_argument('--format', choices=['ndjson', 'csv'], default='ndjson')
+    fetch.add_argument('--show', nargs='+', help='only export these shows')
+    fetch.add_argument('--network', nargs='+', help='only export these networks')
+    fetch.add_argument('--limit', type=int, help='entries per chart')
+    pages = fetch.add_mutually_exclusive_group()
+    pages.add_argument('--cache', metavar='DIR', help='keep downloaded pages in DIR')
+    pages.add_argument('--archive', metavar='FILE',
+                       help='keep downloaded pages in the pack archive FILE')
+    fetch.add_argument('--rate', type=float, help='requests per second')
+    fetch.add_argument('--burst', type=int, help='requests sent back to back')
+    fetch.add_argument('--progress', action='store_true',
+                       help='report each finished chart on stderr')
+    fetch.set_defaults(func=run_fetch)
+
+    bench = commands.add_parser('bench', help='time the pipeline on recorded pages')
+    bench.add_argument('pages', nargs='+', help='recorded HTML pages')
+    bench.add_argument('--category', choices=CATEGORIES, required=True)
+    bench.add_argument('--date', required=True, help='date of the recorded pages')
+    bench.add_argument('--repeat', type=int, default=10,
+                       help='runs of the pipeline per page')
+    bench.add_argument('--memory', action='store_true',
+                       help='report the footprint of each retention policy instead')
+    bench.set_defaults(func=run_bench)
+
+    serve = commands.add_parser('serve', help='serve archived pages as a local stand-in site')
+    serve.add_argument('archive', help='pack archive of recorded pages')
+    serve.add_argument('--port', type=int, default=8000)
+    serve.add_argument('--latency', type=float, default=0,
+                       help='seconds before each response')
+    serve.add_argument('--jitter', type=float, default=0,
+                       help='up to this many seconds added to the latency')
+    serve.add_argument('--error-rate', type=float, default=0,
+                       help='share of requests answered with 503')
+    serve.add_argument('--throughput', type=int,
+                       help='bytes per second pages are sent at')
+    serve.add_argument('--seed', type=int, help='seed of the injected latency and errors')
+    serve.set_defaults(func=run_serve)
+
+    backfill = commands.add_parser(
+        'backfill', help='fetch a range of days from a resumable task queue')
+    backfill.add_argument('queue', help='SQLite file of the tasks, shared by every worker')
+    backfill.add_argument('--category', nargs='+', choices=CATEGORIES, default=['final'],
+                          help='charts to add tasks for (default: final)')
+    backfill.add_argument('--from', dest='start', default=None,
+                          help='first date of the tasks to add')
+    backfill.add_argument('--to', dest='end', default=None,
+                          help='last date of the tasks to add (default: the first date)')
+    backfill.add_argument('--workers', type=int, default=4,
+                          help='tasks worked on at the same time')
+    backfill.add_argument('--archive', metavar='FILE',
+                          help='keep downloaded pages in the pack archive FILE '
+                               '(only shared by processes on this host)')
+    backfill.add_argument('--index', metavar='FILE', help='ingest charts into a show index')
+    backfill.add_argument('--retry-failed', action='store_true',
+                          help='retry the tasks that ran out of attempts')
+    backfill.add_argument('--status', action='store_true',
+                          help='only report the progress of the queue')
+    backfill.add_argument('--progress', action='store_true',
+                          help='report progress on stderr while working')
+    backfill.add_argument('--interval', type=float, default=10,
+                          help='seconds between progress reports')
+    backfill.set_defaults(func=run_backfill)
+
+    return parser
+
+
+def main(argv=None):
+    args = get_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,10 +1,40 @@
 from datetime import datetime, timedelta
 
 DATE_FMT = '%B %-d %Y'
-YESTERDAY = (datetime.today() - timedelta(days=1)).strftime(DATE_FMT)
 
 HEADERS = {'User-Agent': 'zap2it.py (https://github.com/sharibarboza/zap2it)'}
 
+# Politeness settings for the shared request scheduler
+RATE_LIMIT = 2.0
+RATE_BURST = 5
+REQUEST_TIMEOUT = 10
+REQUEST_RETRIES = 3
+RETRY_BACKOFF = 1.0
+
+# Number of parsed charts kept in memory
+CHART_CACHE_SIZE = 128
+
+# Pages are read in chunks so the title can be checked before the download
+# finishes. Checking stops once this many bytes are read.
+CHUNK_SIZE = 8192
+VERIFY_MAX_BYTES = 131072
+
+# What a ratings object keeps of its page after parsing:
+# 'soup' - the parsed page, 'html' - the compressed page, 'none' - nothing
+RETENTION_POLICIES = ['soup', 'html', 'none']
+DEFAULT_RETENTION = 'soup'
+
+# Backfill tasks: seconds a claimed task is reserved for its worker,
+# attempts before a task fails, seconds before the first retry, and the
+# last seconds of work the completion rate is measured over
+BACKFILL_LEASE = 300
+BACKFILL_RETRIES = 5
+BACKFILL_BACKOFF = 60
+BACKFILL_WINDOW = 600
+
+# Seconds before a url that was not found is tried again
+MISSING_URL_TTL = 3600
+
 BASE_URL = 'http://tvbythenumbers.zap2it.com'
 URL_FORMAT = '{0}/daily-ratings/{1}-{2}-{3}/'
 SEARCH_URL = '{0}/?s={1}+{2}&year={3}&monthnum={4}&day&category=daily-ratings'
@@ -20,7 +50,21 @@ SHORT_MONTHS = [
     'sept', 'oct', 'nov', 'dec'
 ]
 
+WEEKDAYS = [
+    'monday', 'tuesday', 'wednesday', 'thursday',
+    'friday', 'saturday', 'sunday'
+]
+
 FLOAT_ATTRIBUTES = ['viewers', 'rating', 'share']
 NONFLOAT_ATTRIBUTES = ['show', 'net', 'time', 'date']
 
 PAGE_ERROR = "The page cannot be found."
+
+
+def __getattr__(name):
+    """YESTERDAY is evaluated on every access so long running processes
+    do not keep the date from when the module was imported.
+    """
+    if name == 'YESTERDAY':
+        return (datetime.today() - timedelta(days=1)).strftime(DATE_FMT)
+    raise AttributeError("module {0!r} has no attribute {1!r}".format(__name__, name))
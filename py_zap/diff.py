@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+
+from .constants import FLOAT_ATTRIBUTES
+from .utils import (PageNotFoundError, to_json, convert_time, get_date_info,
+                    date_range, new_session)
+from .py_zap import Broadcast
+from .throttle import background, inherit_priority
+
+
+def entry_key(entry):
+    """Return a hashable key of the normalized show, network and time."""
+    try:
+        time = convert_time(str(entry.time))
+    except ValueError:
+        time = str(entry.time).lower()
+    return (entry.key, str(entry.net).lower(), time)
+
+
+class EntryDelta(object):
+    """The change of a broadcast entry between fast and final ratings."""
+
+    def __init__(self, fast, final):
+        """Deltas are final minus fast. A delta is None when either value is
+        not a number (e.g. 'n/a').
+
+        :param fast: The fast affiliate entry.
+        :param final: The final entry.
+        """
+        self.show = final.show
+        self.net = final.net
+        self.time = final.time
+
+        for attr in FLOAT_ATTRIBUTES:
+            before = fast[attr]
+            after = final[attr]
+            self.__dict__['fast_' + attr] = before
+            self.__dict__['final_' + attr] = after
+            try:
+                self.__dict__[attr] = round(after - before, 2)
+            except TypeError:
+                self.__dict__[attr] = None
+
+    def __repr__(self):
+        return '|{:<30.30s}|{:>10s}|{:>7.7s}|{:>+7.2f}|{:>+7.1f}|'.format(
+            self.show, self.time, self.net, self.viewers or 0.0, self.rating or 0.0)
+
+    def __getitem__(self, item):
+        return self.__dict__[item]
+
+    def get_json(self):
+        """Represent delta object as a JSON string"""
+        return to_json(self)
+
+
+class RatingsDiff(object):
+    """Joins the fast affiliate and final broadcast charts of a day."""
+
+    def __init__(self, date=None, show=None, network=None, session=None):
+        """Both charts are fetched at the same time and joined on a hashed key
+        of the normalized show, network and time.
+
+        :param date: Default - yesterday's date.
+        :param show: Will only compare a specific show.
+        :param network: Will only compare a specific network.
+        :param session: Optional requests session shared between fetches.
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        self.date, self.date_obj, self.weekday = get_date_info(date)
+        params = (self.date, show, network, None)
+
+        fetch = inherit_priority(Broadcast)
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            fast = executor.submit(fetch, *params, final=False, session=session)
+            final = executor.submit(fetch, *params, final=True, session=session)
+            self.fast = fast.result()
+            self.final = final.result()
+
+        self.deltas, self.unmatched_fast, self.unmatched_final = self._join()
+
+    def __iter__(self):
+        for delta in self.deltas:
+            yield delta
+
+    def __getitem__(self, item):
+        return self.deltas[item]
+
+    def __len__(self):
+        return len(self.deltas)
+
+    def get_all(self, attr):
+        """Returns a list of the requested attribute from all deltas"""
+        return [delta[attr] for delta in self.deltas]
+
+    def get_json(self):
+        """Serialize diff object as JSON-formatted string"""
+        diff_dict = {
+            'date': self.date,
+            'day': self.weekday,
+            'deltas': self.deltas,
+            'unmatched fast': self.unmatched_fast,
+            'unmatched final': self.unmatched_final
+        }
+        return to_json(diff_dict)
+
+    def _join(self):
+        """Hash join the fast entries against the final entries"""
+        fast_entries = {}
+        for entry in self.fast:
+            fast_entries.setdefault(entry_key(entry), entry)
+
+        deltas = []
+        unmatched_final = []
+        for entry in self.final:
+            fast = fast_entries.pop(entry_key(entry), None)
+            if fast is None:
+                unmatched_final.append(entry)
+            else:
+                deltas.append(EntryDelta(fast, entry))
+
+        return deltas, list(fast_entries.values()), unmatched_final
+
+
+def diff_range(start, end, show=None, network=None, workers=4):
+    """Diff fast and final ratings for every day from start to end (inclusive).
+    Days without both charts are skipped. Returns a list of RatingsDiff objects.
+
+    :param workers: Number of days compared at the same time.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    def diff_day(date):
+        try:
+            with background():
+                return RatingsDiff(date, show=show, network=network, session=session)
+        except PageNotFoundError:
+            return None
+
+    with new_session() as session, ThreadPoolExecutor(max_workers=workers) as executor:
+        diffs = executor.map(diff_day, date_range(start, end))
+        return [diff for diff in diffs if diff is not None]
@@ -0,0 +1,205 @@
+#!/usr/bin/env python
+
+import threading
+from collections import namedtuple
+
+from .constants import DATE_FMT
+from .utils import filter_stopwords, match_list, get_date_info, to_list
+
+# A chart row of a show, found by a ShowIndex lookup
+Airing = namedtuple('Airing', ['date', 'category', 'offset', 'show', 'net'])
+
+
+def get_index_date(date):
+    """Return the date string charts are indexed by, e.g. 'July 25 2017'."""
+    return get_date_info(date)[1].strftime(DATE_FMT)
+
+
+class ShowIndex(object):
+    """Inverted index of the shows and networks of every ingested chart.
+
+    Show names are split into words the same way match_list does, and each
+    word maps to (day, category, row offset) postings. A lookup intersects
+    the postings of the query words and confirms the candidates with
+    match_list, so it finds the same rows as filtering every chart with
+    show= or network=, without parsing any page.
+
+    With a path, every ingested chart is appended to a JSON-lines file and
+    the index is rebuilt from it when opened again.
+    """
+
+    def __init__(self, path=None):
+        """
+        :param path: Where the index is kept, e.g. next to a PageArchive.
+                     None keeps it in memory only.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._charts = {}
+        self._days = {}
+        self._shows = {}
+        self._networks = {}
+
+        if path is not None:
+            self._read()
+
+    def _read(self):
+        import json
+        import os
+
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                self._add(record['category'], record['date'], record['rows'])
+
+    def _add(self, category, date, rows):
+        """Index the (show, network) rows of a chart, replacing the rows it
+        had if it was ingested before.
+        """
+        key = (category, date)
+        if key in self._charts:
+            self._remove(key)
+
+        day = get_date_info(date)[1].toordinal()
+        rows = tuple((show, net) for show, net in rows)
+        self._charts[key] = (day, rows)
+        self._days[day] = date
+
+        for offset, (show, net) in enumerate(rows):
+            posting = (day, category, offset)
+            for word in set(filter_stopwords(show or '')):
+                self._shows.setdefault(word, set()).add(posting)
+            for word in set(filter_stopwords(net or '')):
+                self._networks.setdefault(word, set()).add(posting)
+
+    def _remove(self, key):
+        day, rows = self._charts.pop(key)
+        for words in (self._shows, self._networks):
+            for word in list(words):
+                postings = words[word]
+                postings.difference_update(
+                    (day, key[0], offset) for offset in range(len(rows)))
+                if not postings:
+                    del words[word]
+
+    def ingest(self, ratings):
+        """Index the unfiltered chart of a Cable or Broadcast object."""
+        import json
+
+        rows = [(str(entry.show), str(entry.net)) for entry in ratings.chart]
+        date = get_index_date(ratings.date)
+
+        with self._lock:
+            self._add(ratings.category, date, rows)
+            if self.path is not None:
+                with open(self.path, 'a') as f:
+                    f.write(json.dumps({'category': ratings.category, 'date': date,
+                                        'rows': rows}) + '\n')
+
+    def update(self, archive, categories=None):
+        """Ingest the archived days that are not indexed yet.
+        Returns the number of charts ingested.
+
+        :param archive: A PageArchive.
+        :param categories: Only ingest these categories. Default - all.
+        """
+        from .utils import PageNotFoundError
+
+        count = 0
+        for category in categories or ['cable', 'final', 'tv']:
+            for date in archive.dates(category):
+                if (category, date) in self:
+                    continue
+                try:
+                    self.ingest(archive.ratings(category, date, retain='none'))
+                except PageNotFoundError:
+                    continue
+                count += 1
+        return count
+
+    def find(self, show=None, network=None, category=None, start=None, end=None):
+        """Return every airing of a show and/or on a network in date order.
+
+        :param show: Show name or list of names, matched like Ratings show=.
+        :param network: Network or list of networks, matched like network=.
+        :param category: Only search charts of this category.
+        :param start: First date searched. Default - the first indexed day.
+        :param end: Last date searched. Default - the last indexed day.
+        """
+        first = get_date_info(start)[1].toordinal() if start else None
+        last = get_date_info(end)[1].toordinal() if end else None
+        shows, networks = to_list(show), to_list(network)
+
+        with self._lock:
+            if shows:
+                postings = self._lookup(self._shows, shows)
+            elif networks:
+                postings = self._lookup(self._networks, networks)
+            else:
+                postings = self._all_postings()
+
+            airings = []
+            for day, chart_category, offset in postings:
+                if category and chart_category != category:
+                    continue
+                if (first and day < first) or (last and day > last):
+                    continue
+
+                key = (chart_category, self._days[day])
+                show_name, net = self._charts[key][1][offset]
+                if shows and not match_list(shows, show_name):
+                    continue
+                if networks and not match_list(networks, net):
+                    continue
+                airings.append((day, chart_category, offset, show_name, net))
+
+        airings.sort()
+        return [Airing(self._days[day], chart_category, offset, show_name, net)
+                for day, chart_category, offset, show_name, net in airings]
+
+    def find_dates(self, show=None, network=None, category=None, start=None, end=None):
+        """Return the dates a show aired and/or a network had entries."""
+        dates = []
+        for airing in self.find(show, network, category, start, end):
+            if not dates or dates[-1] != airing.date:
+                dates.append(airing.date)
+        return dates
+
+    def _lookup(self, words, queries):
+        """Return the candidate postings of any of the queries. A query word
+        matches every indexed word containing it, the same as match_list.
+        """
+        candidates = set()
+        for query in queries:
+            postings = None
+            for word in filter_stopwords(query):
+                matches = set()
+                for indexed, indexed_postings in words.items():
+                    if word in indexed:
+                        matches.update(indexed_postings)
+                postings = matches if postings is None else postings & matches
+                if not postings:
+                    break
+
+            candidates.update(self._all_postings() if postings is None else postings)
+        return candidates
+
+    def _all_postings(self):
+        return set((day, category, offset)
+                   for (category, _), (day, rows) in self._charts.items()
+                   for offset in range(len(rows)))
+
+    def __contains__(self, key):
+        """Return True if the (category, date) chart is indexed."""
+        category, date = key
+        with self._lock:
+            return (category, get_index_date(date)) in self._charts
+
+    def __len__(self):
+        with self._lock:
+            return len(self._charts)
@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+
+import threading
+from collections import namedtuple
+
+# Chart columns of each kind of page, in the order the parsers expect them
+# on pages without a recognised header
+COLUMNS = {
+    'cable': ['show', 'net', 'time', 'viewers', 'rating'],
+    'broadcast': ['time', 'show', 'rating', 'viewers']
+}
+
+# Header cell words naming each column, checked in this order
+COLUMN_NAMES = [
+    ('rating', ['rating']),
+    ('viewers', ['viewer', '000']),
+    ('show', ['show', 'program']),
+    ('net', ['net']),
+    ('time', ['time'])
+]
+
+# What a page template is recognised by: the title tags before the chart
+# and the cells of the chart header
+Signature = namedtuple('Signature', ['title_tags', 'header'])
+
+# How the chart of a page template is read: the tag its title is in, the
+# index of the cell of each column in COLUMNS order, and the rows before and
+# after the chart rows. Known templates are read from the chart table and
+# the table after it, unknown ones from every row of the page.
+Layout = namedtuple('Layout', ['fingerprint', 'known', 'title_tag', 'order',
+                               'head_rows', 'tail_rows'])
+
+# Rows after the chart on broadcast pages of unknown templates
+DEFAULT_TAIL_ROWS = 3
+
+
+def get_kind(category):
+    return 'cable' if category == 'cable' else 'broadcast'
+
+
+def get_signature(soup):
+    """Read the page template signature from a soup. Only the page before
+    the first table row and that row are looked at.
+    """
+    first_row = soup.find('tr')
+    if first_row is None:
+        return Signature((), ())
+
+    names = set(tag.name for tag in first_row.find_all_previous(['strong', 'b']))
+    title_tags = tuple(tag for tag in ('strong', 'b') if tag in names)
+    header = tuple((cell.get_text() or '').strip().lower()
+                   for cell in first_row.find_all(['td', 'th']))
+    return Signature(title_tags, header)
+
+
+def get_title_strings(soup, tag):
+    """Return the strings of the title tags before the chart, in page order."""
+    first_row = soup.find('tr')
+    if first_row is None:
+        return []
+    return [title.string for title in reversed(first_row.find_all_previous(tag))
+            if title.string]
+
+
+def get_chart_table(soup):
+    """Return the table of the chart, the one holding the header row."""
+    first_row = soup.find('tr')
+    return None if first_row is None else first_row.find_parent('table')
+
+
+def get_fingerprint(signature):
+    """Return a short, stable hash of a page template signature."""
+    import hashlib
+    return hashlib.sha1(repr(tuple(signature)).encode('utf-8')).hexdigest()[:12]
+
+
+def get_columns(header):
+    """Map each column name to its cell index from the header cells.
+    Returns None if a cell is not recognised.
+    """
+    columns = {}
+    for index, text in enumerate(header):
+        for name, words in COLUMN_NAMES:
+            if name not in columns and any(word in text for word in words):
+                columns[name] = index
+                break
+        else:
+            return None
+    return columns
+
+
+def build_layout(signature, kind):
+    """Build the layout of a page template. Templates whose header does not
+    have exactly the columns of the kind of page are unknown, and are read
+    with the default column order and row counts.
+    """
+    fingerprint = get_fingerprint(signature)
+    columns = get_columns(signature.header)
+    known = columns is not None and sorted(columns) == sorted(COLUMNS[kind])
+
+    if not known:
+        tail_rows = DEFAULT_TAIL_ROWS if kind == 'broadcast' else 0
+        return Layout(fingerprint, False, None, tuple(range(len(COLUMNS[kind]))),
+                      1, tail_rows)
+
+    # Cable titles are in strong tags, broadcast titles in b tags if the
+    # page has any
+    title_tag = 'strong'
+    if kind == 'broadcast' and 'b' in signature.title_tags:
+        title_tag = 'b'
+
+    order = tuple(columns[name] for name in COLUMNS[kind])
+    return Layout(fingerprint, True, title_tag, order, 1, 0)
+
+
+class LayoutCache(object):
+    """Layouts of the page templates seen so far, built once per template."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._layouts = {}
+        self.unknown = {}
+
+    def detect(self, soup, category):
+        """Return the layout of a page. Pages of an unknown template are
+        recorded in unknown by fingerprint.
+        """
+        kind = get_kind(category)
+        signature = get_signature(soup)
+
+        with self._lock:
+            layout = self._layouts.get((kind, signature))
+            if layout is None:
+                layout = self._layouts[(kind, signature)] = build_layout(signature, kind)
+            if not layout.known:
+                self.unknown.setdefault(layout.fingerprint, signature)
+        return layout
+
+    def clear(self):
+        with self._lock:
+            self._layouts.clear()
+            self.unknown.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._layouts)
+
+
+# Shared by every Ratings object
+layouts = LayoutCache()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+
+import re
+import sys
+import unicodedata
+from functools import lru_cache
+
+from .utils import convert_float, safe_unicode, filter_stopwords
+
+PUNCTUATION = re.compile(r'[^\w\s]')
+APOSTROPHES = re.compile(u'[‘’ʼ`]')
+
+
+def to_text(value):
+    """Return a plain string. Parsed strings are copied out of the soup so
+    entries do not keep the page tree alive.
+    """
+    if value is None:
+        return None
+    return safe_unicode(str(value))
+
+
+def to_interned(value):
+    """Return a plain string shared by every entry with the same value."""
+    if value is None:
+        return None
+    return sys.intern(str(value))
+
+
+def to_number(value):
+    """Convert a string into a float, otherwise return the string (e.g. 'n/a')."""
+    if value is None or isinstance(value, float):
+        return value
+    return convert_float(to_text(value))
+
+
+# Converter for each entry column
+CONVERTERS = {
+    'show': to_text,
+    'net': to_interned,
+    'time': to_interned,
+    'date': to_text,
+    'viewers': to_number,
+    'rating': to_number,
+    'share': to_number
+}
+
+
+def normalize_row(row):
+    """Convert each field of a parsed row with the converter of its column.
+    Unknown columns fall back to float conversion.
+    """
+    for key, value in row.items():
+        converter = CONVERTERS.get(key)
+        if converter is None:
+            row[key] = convert_float(safe_unicode(value))
+        else:
+            row[key] = converter(value)
+    return row
+
+
+@lru_cache(maxsize=16384)
+def show_key(show):
+    """Return the canonical key of a show name for matching and deduping.
+
+    Accents, apostrophes, punctuation and stop words are removed, so
+    'Grey’s Anatomy' and "Greys Anatomy" share the key 'greys anatomy'.
+    """
+    if show is None:
+        return ''
+
+    text = unicodedata.normalize('NFKD', str(show))
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    text = APOSTROPHES.sub('', text.replace("'", ''))
+    text = PUNCTUATION.sub(' ', text)
+    return sys.intern(' '.join(filter_stopwords(text)))
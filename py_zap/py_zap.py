@@ -28,12 +28,44 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 '''
 
+import copy
 import re
+from collections import namedtuple
+from operator import itemgetter
 
 from .utils import *
-from .constants import YESTERDAY, URL_FORMAT, BASE_URL, SEARCH_URL, PAGE_ERROR
+from .constants import PAGE_ERROR, RETENTION_POLICIES, DEFAULT_RETENTION
 from .search import SearchDaily
 from .sorter import Sorter
+from .singleflight import SingleFlight
+from .cache import chart_cache
+from .render import get_renderer
+from .urls import build_url, candidate_urls, url_knowledge
+from .normalize import normalize_row, show_key, to_interned
+from .layout import layouts, get_title_strings, get_chart_table
+
+# Charts being built right now, keyed by (category, date)
+_chart_flights = SingleFlight()
+
+# A parsed, unfiltered chart as stored in the chart cache. Only the object
+# that parsed the page keeps its soup, the cache keeps it compressed in html
+Chart = namedtuple('Chart', ['url', 'entries', 'averages', 'title', 'html',
+                             'diagnostics', 'layout'])
+
+# A chart row that could not be parsed: its position among the chart rows,
+# its text and the error
+RowError = namedtuple('RowError', ['index', 'text', 'error'])
+
+# Retention policy of ratings objects created without one, see set_retention
+_retention = DEFAULT_RETENTION
+
+# Network averages of a broadcast chart
+NetworkAverage = namedtuple('NetworkAverage', ['network', 'viewers', 'rating', 'share'])
+
+# Title tags and the start of the chart in raw page HTML
+TITLE_TAG = re.compile(r'<(strong|b)\b[^>]*>(.*?)</\1\s*>', re.I | re.S)
+INNER_TAG = re.compile(r'<[^>]+>')
+CHART_ROW = re.compile(r'<tr\b', re.I)
 
 
 class Entry(object):
@@ -50,31 +82,20 @@ class Entry(object):
         :param share: For Broadcast only. The percentage of TV's currently on
                       that are viewing the show.
         """
-        for key, value in kwargs.items():
-            kwargs[key] = convert_float(safe_unicode(value))
-        self.__dict__.update(kwargs)
+        self.__dict__.update(normalize_row(kwargs))
 
-    def __repr__(self):
-        """Format row for entry object in a ratings chart"""
-        s = None
+    @property
+    def key(self):
+        """Canonical show name used to match entries across charts"""
+        return show_key(self.show)
 
-        try:
-            # Set width for network column (cable has longer width)
-            width = 7 if hasattr(self, 'share') else 16
-
-            s = '|{:<30.30s}|{:>10s}|'.format(self.show, self.time)
-            s += '{0:>{1}.{2}}|'.format(self.net, width, width)
-            s += '{:7.2f}|{:7.1f}|'.format(self.viewers, self.rating)
-
-            # For broadcast only
-            if hasattr(self, 'share'):
-                s += '{:7.1f}|'.format(self.share)
-        except TypeError:
-            # Return None if entry cannot be represented
-            s = None
-        finally:
-            # Return repr string
-            return s
+    def __repr__(self):
+        """Format row for entry object in a ratings chart.
+        Returns None if the entry cannot be represented.
+        """
+        # Cable entries have no share and a wider network column
+        category = 'final' if 'share' in self.__dict__ else 'cable'
+        return get_renderer(category).format_entry(self)
 
     def __getitem__(self, item):
         """Return entry object when accessed by index"""
@@ -96,27 +117,101 @@ class Ratings(object):
         :param network: Will only fetch data of a specific network.
         :param limit: Will stop fetching data once the limit has been reached.
         :param date: Default - yesterday's date.
+        :param session: Optional requests session shared between fetches.
+        :param retain: What is kept of the page after parsing: 'soup',
+                       'html' (compressed) or 'none'. See set_retention.
+        """
+        self._set_params(kwargs)
+
+        # The unfiltered chart is cached and concurrent requests for the same
+        # chart share one fetch and parse, then each caller applies its own
+        # filters
+        key = (self.category, self.date)
+        chart = chart_cache.get(key)
+        if chart is None or not self._keeps_page(chart):
+            chart = _chart_flights.do(key, self._load_chart)
+        self._set_chart(chart)
+
+    @classmethod
+    def _from_html(cls, html, category, date=None, url=None, **kwargs):
+        """Build a ratings object from a page that was already downloaded.
+        The page is parsed directly, without the network or the chart cache.
         """
+        ratings = cls.__new__(cls)
+        kwargs.update(category=category, date=date)
+        ratings._set_params(kwargs)
+        ratings.url = url
+        ratings.soup = parse_html(html)
+        ratings._set_chart(ratings._parse_chart())
+        return ratings
+
+    def _set_params(self, kwargs):
+        """Set the query parameters and the date attributes."""
+        kwargs.setdefault('session', None)
+        kwargs.setdefault('limit', None)
+        kwargs['retain'] = get_retention(kwargs.get('retain'))
+
+        self.network_averages = None
+        self.diagnostics = []
+        self.layout = None
+        self._soup = None
+        self._html = None
+        self._title = None
 
         # Convert show and network attributes to lists
         for attr in ["show", "network"]:
-            key = kwargs.get(attr)
-            if key is not None and not isinstance(key, list):
-                kwargs[attr] = [key]
+            kwargs[attr] = to_list(kwargs.get(attr))
         self.__dict__.update(kwargs)
 
-        self.date = convert_string(self.date)
-        self.date_obj = convert_date(self.date)
-        self.weekday = get_day(self.date_obj)
-        self.soup = self._get_ratings_page()
+        self.date, self.date_obj, self.weekday = get_date_info(self.date)
         self.next_week = next_week(self.date_obj)
         self.last_week = last_week(self.date_obj)
 
-        # After finding the page, grab the results
-        if self._verify_page():
-            self.entries = self.fetch_entries()
-        else:
-            raise PageNotFoundError(PAGE_ERROR)
+    def _keeps_page(self, chart):
+        """Return True if a cached chart holds the page this policy keeps."""
+        return self.retain == 'none' or chart.html is not None
+
+    def _set_chart(self, chart):
+        """Take the parsed chart, keeping the page as the retention policy says."""
+        self.url = chart.url
+        self.chart = chart.entries
+        self.network_averages = chart.averages
+        self.diagnostics = chart.diagnostics
+        self.layout = chart.layout
+        self._title = chart.title
+        self._html = chart.html if self.retain != 'none' else None
+        if self.retain != 'soup':
+            self._soup = None
+        self.entries = self._filter_entries(self.chart)
+
+    @property
+    def soup(self):
+        """The parsed page. With the 'html' retention policy it is parsed
+        again from the compressed page on each access. With 'soup' a page
+        taken from the chart cache is parsed on first access.
+        """
+        if self._soup is None and self._html is not None:
+            import zlib
+            soup = parse_html(zlib.decompress(self._html))
+            if self.retain == 'soup':
+                self._soup = soup
+            return soup
+        return self._soup
+
+    @soup.setter
+    def soup(self, soup):
+        self._soup = soup
+
+    def filter(self, show=None, network=None, limit=None):
+        """Return a view of the full chart with different filters. The view
+        shares the entries of this object and does not fetch the page again.
+        """
+        view = copy.copy(self)
+        view.show = to_list(show)
+        view.network = to_list(network)
+        view.limit = limit
+        view.entries = view._filter_entries(self.chart)
+        return view
 
     def sort(self, attr):
         """Sort the ratings based on an attribute"""
@@ -147,7 +242,13 @@ class Ratings(object):
         """Title is either the chart header for a cable ratings page or above
         the opening description for a broadcast ratings page.
         """
-        if self.category == 'cable':
+        if self._title is not None:
+            return self._title
+
+        # Known templates have their title in one tag before the chart
+        if self.layout is not None and self.layout.known:
+            strings = get_title_strings(self.soup, self.layout.title_tag)
+        elif self.category == 'cable':
             strings = get_strings(self.soup, 'strong')
         else:
             strings = get_strings(self.soup, 'b')
@@ -194,17 +295,72 @@ class Ratings(object):
     def __len__(self):
         return len(self.entries)
 
-    def _get_url_params(self, shorten=True):
-        """Returns a list of each parameter to be used for the url format."""
-        cable = True if self.category == 'cable' else False
-        url_date = convert_month(self.date, shorten=shorten, cable=cable)
+    def _load_chart(self):
+        """Find the ratings page and parse every entry in the chart."""
+        self.soup = self._get_ratings_page()
+        chart = self._parse_chart()
+        chart_cache.set((self.category, self.date), chart)
+        return chart
+
+    def _parse_chart(self):
+        """Verify the page date and parse every entry in the chart."""
+        # The page template decides where the title, rows and cells are
+        self.layout = layouts.detect(self.soup, self.category)
+
+        # After finding the page, grab the results
+        if self._verify_page():
+            entries = self.fetch_entries()
+            title = self.get_title()
+
+            # 'soup' objects taking the chart from the cache parse it again
+            html = None
+            if self.retain != 'none':
+                import zlib
+                html = zlib.compress(str(self.soup).encode('utf-8'))
+            if self.retain != 'soup':
+                self._soup = None
+
+            return Chart(self.url, entries, self.network_averages, title, html,
+                         self.diagnostics, self.layout)
+        else:
+            raise PageNotFoundError(PAGE_ERROR)
+
+    def _parse_rows(self, rows):
+        """Build an entry from the cells of each row with _parse_row.
+        Rows that cannot be parsed are left out and recorded in diagnostics
+        instead of failing the whole chart.
+        """
+        # Cells are picked in the order _parse_row reads them
+        pick = itemgetter(*self._get_layout().order)
+
+        data = []
+        self.diagnostics = []
+        for index, row in enumerate(rows):
+            try:
+                data.append(Entry(**self._parse_row(pick(get_cells(row)))))
+            except (IndexError, AttributeError, TypeError, ValueError) as e:
+                self.diagnostics.append(
+                    RowError(index, row.get_text(' ', strip=True), repr(e)))
+        return data
+
+    def _get_layout(self):
+        """Return the layout of the page, detecting it if needed."""
+        if self.layout is None:
+            self.layout = layouts.detect(self.soup, self.category)
+        return self.layout
 
-        return [
-            BASE_URL,
-            self.weekday.lower(),
-            self.category + '-ratings',
-            url_date.replace(' ', '-')
-        ]
+    def _filter_entries(self, entries):
+        """Apply the show, network and limit parameters to chart entries."""
+        data = []
+        for entry in entries:
+            # Stop once the limit has been met
+            if exceeded_limit(self.limit, len(data)):
+                break
+
+            if self._match_query(str(entry.show), str(entry.net)):
+                data.append(entry)
+
+        return data
 
     def _match_query(self, show, net):
         return self._match_show(show) and self._match_net(net)
@@ -225,38 +381,83 @@ class Ratings(object):
 
     def _verify_page(self):
         """Verify the ratings page matches the correct date"""
-        title_date = self._get_date_in_title().lower()
+        return self._match_date(self._get_date_in_title())
+
+    def _verify_head(self, head):
+        """Check the start of a page while it downloads.
+
+        Returns False only once the title get_title would return is known to
+        have another date, True to read the rest of the page, or None if more
+        of the page is needed. The full page is always checked by
+        _verify_page after parsing, so anything uncertain is left to it.
+        """
+        from html import unescape
+
+        chart_start = CHART_ROW.search(head)
+        end = chart_start.start() if chart_start else len(head)
+
+        # Title strings before the chart by tag. Tags with markup inside are
+        # None, get_strings may not see them.
+        strings = {'strong': [], 'b': []}
+        for match in TITLE_TAG.finditer(head, 0, end):
+            inner = match.group(2)
+            text = None if INNER_TAG.search(inner) else unescape(inner)
+            if text != '':
+                strings[match.group(1).lower()].append(text)
+
+        # A cable title is the first strong string of the page, so it is
+        # known as soon as that tag has arrived
+        if self.category == 'cable' and strings['strong'] and strings['strong'][0]:
+            return self._match_date(self._clean_title(strings['strong'][0]))
+
+        # Broadcast titles join every title string of the page, and more may
+        # follow, so only a match is certain here
+        texts = [unescape(INNER_TAG.sub('', match.group(2)))
+                 for match in TITLE_TAG.finditer(head, 0, end)]
+        if self._match_date(self._clean_title(''.join(texts))):
+            return True
+        return True if chart_start else None
+
+    def _clean_title(self, title):
+        """Normalise a title the same way for the streaming and full checks."""
+        return convert_string(unescape_html(title))
+
+    def _match_date(self, title_date):
+        """Check the date terms of the ratings page are in a title"""
+        title_date = title_date.lower()
         split_date = self.date.lower().split()
         split_date[0] = split_date[0][:3]
         return all(term in title_date for term in split_date)
 
     def _get_date_in_title(self):
         """Extract the date string from the title."""
-        title = unescape_html(''.join(self.get_title()))
-        return convert_string(title)
+        return self._clean_title(''.join(self.get_title()))
 
     def _get_ratings_page(self):
         """Do a limited search for the correct url."""
-        # Use current posted date to build url
-        self._build_url()
-        soup = get_soup(self.url)
-        if soup:
-            return soup
-
-        # Try building url again with unshortened month
-        self._build_url(shorten=False)
-        soup = get_soup(self.url)
-        if soup:
-            return soup
+        # Try the short and long month urls, skipping urls known to be missing
+        urls = url_knowledge.order(candidate_urls(self.category, self.date_obj))
+        for url in urls:
+            self.url = url
+            status, soup = fetch_page(url, session=self.session, verify=self._verify_head)
+
+            # Only a 404 means the page is not at this url. Failed requests
+            # and aborted downloads are tried again next time.
+            if soup is not None or status == 404:
+                url_knowledge.record(url, soup is not None)
+            if soup:
+                return soup
 
         # If not page is found, use search
-        return SearchDaily(self.category, date=self.date).fetch_result()
+        search = SearchDaily(self.category, date=self.date, session=self.session)
+        return search.fetch_result()
 
 
 class Cable(Ratings):
     """Ratings subclass that parses daily cable ratings charts."""
 
-    def __init__(self, date=YESTERDAY, show=None, network=None, limit=None):
+    def __init__(self, date=None, show=None, network=None, limit=None,
+                 session=None, retain=None):
         """
         Cable shows are shows not belonging to a major broadcast network.
         By default, will output the top 100 cable shows for that day.
@@ -266,7 +467,9 @@ class Cable(Ratings):
             'date': date,
             'show': show,
             'network': network,
-            'limit': limit
+            'limit': limit,
+            'session': session,
+            'retain': get_retention(retain)
         }
 
         try:
@@ -274,64 +477,58 @@ class Cable(Ratings):
         except Exception:
             raise PageNotFoundError(PAGE_ERROR) from None
 
-    def __repr__(self):
-        s = 'Cable Ratings for {day}, {date}'.format(
-            day=self.weekday, date=self.date.title())
-        s += '\n|{:<30s}|{:<10s}|{:<16s}|{:<7s}|{:<7s}|'.format(
-            'Show', 'Time', 'Network', 'Viewers', 'Rating')
-        s += '\n+' + '-' * 74 + '+'
+    @classmethod
+    def from_html(cls, html, date=None, url=None, show=None, network=None,
+                  limit=None, retain=None):
+        """Parse a cable ratings page that was already downloaded.
 
-        for entry in self:
-            try:
-                s += '\n{0}'.format(entry)
-            except TypeError:
-                pass
-        return s
+        :param html: The page HTML as a string or bytes.
+        :param date: The date of the page. Default - yesterday's date.
+        :param url: The url the page was downloaded from.
+        """
+        return cls._from_html(html, 'cable', date=date, url=url, show=show,
+                              network=network, limit=limit, retain=retain)
+
+    def __repr__(self):
+        return get_renderer(self.category).render(self)
 
     def _build_url(self, shorten=True):
         """Build the url for a cable ratings page"""
-        self.url = URL_FORMAT.format(*self._get_url_params(shorten=shorten))
+        self.url = build_url(self.category, self.date_obj, shorten=shorten)
 
     def get_rows(self):
         """Get the rows from a cable ratings chart"""
-        return self.soup.find_all('tr')[1:]
+        layout = self._get_layout()
+        if layout.known:
+            return get_chart_table(self.soup).find_all('tr')[layout.head_rows:]
+        return self.soup.find_all('tr')[layout.head_rows:]
 
     def fetch_entries(self):
-        """Fetch data and parse it to build a list of cable entries."""
-        data = []
-        for row in self.get_rows():
-            # Stop fetching data if limit has been met
-            if exceeded_limit(self.limit, len(data)):
-                break
-
-            entry = row.find_all('td')
-            entry_dict = {}
-
-            show = entry[0].string
-            net = entry[1].string
-            if not self._match_query(show, net):
-                continue
+        """Parse every row to build a list of cable entries."""
+        return self._parse_rows(self.get_rows())
 
-            entry_dict['show'] = show
-            entry_dict['net'] = net
-            entry_dict['time'] = entry[2].string
+    def _parse_row(self, entry):
+        """Get the fields of a cable entry from the cells of a row"""
+        entry_dict = {}
 
-            if ',' in entry[3].string:
-                entry_dict['viewers'] = entry[3].string.replace(',', '.')
-            else:
-                entry_dict['viewers'] = '0.' + entry[3].string
-            entry_dict['rating'] = entry[4].string
+        entry_dict['show'] = entry[0].string
+        entry_dict['net'] = entry[1].string
+        entry_dict['time'] = entry[2].string
 
-            # Add data to create cable entry
-            data.append(Entry(**entry_dict))
+        if ',' in entry[3].string:
+            entry_dict['viewers'] = entry[3].string.replace(',', '.')
+        else:
+            entry_dict['viewers'] = '0.' + entry[3].string
+        entry_dict['rating'] = entry[4].string
 
-        return data
+        return entry_dict
 
 
 class Broadcast(Ratings):
     """Ratings subclass that parses daily broadcast ratings charts."""
 
-    def __init__(self, date=YESTERDAY, show=None, network=None, limit=None, final=True):
+    def __init__(self, date=None, show=None, network=None, limit=None,
+                 final=True, session=None, retain=None):
         """
         Broadcast shows are shows belonging to the 5 major US broadcast
         networks: ABC, NBC, CBS, FOX, and the CW.
@@ -341,13 +538,16 @@ class Broadcast(Ratings):
         than final ratings.
 
         :param final: Fetch final or 'fast-affiliate' ratings.
+        :param session: Optional requests session shared between fetches.
         """
         broadcast_dict = {
             'category': 'final' if final else 'tv',
             'date': date,
             'show': show,
             'network': network,
-            'limit': limit
+            'limit': limit,
+            'session': session,
+            'retain': get_retention(retain)
         }
 
         try:
@@ -355,74 +555,117 @@ class Broadcast(Ratings):
         except Exception:
             raise PageNotFoundError(PAGE_ERROR) from None
 
-    def __repr__(self):
-        if self.category == 'final':
-            title_cat = 'Final Broadcast Ratings'
-        else:
-            title_cat = 'Fast Affiliate Broadcast Ratings'
+    @classmethod
+    def from_html(cls, html, date=None, url=None, show=None, network=None,
+                  limit=None, final=True, retain=None):
+        """Parse a broadcast ratings page that was already downloaded.
 
-        s = '{0} for {1}, {2}'.format(
-            title_cat, self.weekday, self.date.title())
-        s += '\n|{:<30s}|{:10s}|{:7s}|{:7s}|{:7s}|{:7s}|'.format(
-            'Show', 'Time', 'Network', 'Viewers', 'Rating', 'Share')
-        s += '\n+' + '-' * 73 + '+'
+        :param html: The page HTML as a string or bytes.
+        :param date: The date of the page. Default - yesterday's date.
+        :param url: The url the page was downloaded from.
+        :param final: Whether the page has final or 'fast-affiliate' ratings.
+        """
+        category = 'final' if final else 'tv'
+        return cls._from_html(html, category, date=date, url=url, show=show,
+                              network=network, limit=limit, retain=retain)
 
-        for entry in self:
-            try:
-                s += '\n{0}'.format(entry)
-            except TypeError:
-                pass
-        return s
+    def __repr__(self):
+        return get_renderer(self.category).render(self)
 
     def _build_url(self, shorten=True):
-        """Build the url for a broadcast ratings page"""
-        url_order = self._get_url_params(shorten=shorten)
-
-        # For fast ratings, switch weekday and category in url
-        if self.category != 'final':
-            url_order[1], url_order[2] = url_order[2], url_order[1]
-        self.url = URL_FORMAT.format(*url_order)
+        """Build the url for a broadcast ratings page.
+        Fast ratings urls switch the weekday and category.
+        """
+        self.url = build_url(self.category, self.date_obj, shorten=shorten)
 
     def get_rows(self):
         """Get the rows from a broadcast ratings chart"""
-        table = self.soup.find_all('tr')[1:-3]
-        return [row for row in table if row.contents[3].string]
+        return self._scan_page()[0]
+
+    def _scan_page(self):
+        """Collect the chart rows and the cells of the network averages table."""
+        layout = self._get_layout()
+        if layout.known:
+            return self._read_tables(layout)
+
+        # Unknown templates: walk the whole page once and pick the averages
+        # cells by their width and style
+        rows = []
+        networks = []
+        cells = []
+
+        for tag in self.soup.find_all(['tr', 'td']):
+            if tag.name == 'tr':
+                rows.append(tag)
+            elif tag.get('width') == '77':
+                networks.append(tag)
+            elif tag.get('style', '').startswith('font'):
+                cells.append(tag)
+
+        rows = rows[layout.head_rows:len(rows) - layout.tail_rows]
+        rows = [row for row in rows if self._has_viewers(row, layout.order[3])]
+        return rows, networks, cells
+
+    def _read_tables(self, layout):
+        """Read a known template: the chart rows are the rows of the chart
+        table, and the network averages are the next table, with the networks,
+        the ratings/shares and the viewers in its first three rows.
+        """
+        chart = get_chart_table(self.soup)
+        rows = chart.find_all('tr')[layout.head_rows:]
+        rows = [row for row in rows if self._has_viewers(row, layout.order[3])]
+
+        networks, cells = [], []
+        averages = chart.find_next_sibling('table')
+        if averages is not None:
+            average_rows = averages.find_all('tr', limit=3)
+            if len(average_rows) == 3:
+                networks = get_cells(average_rows[0])
+                cells = get_cells(average_rows[1]) + get_cells(average_rows[2])
+        return rows, networks, cells
+
+    def _has_viewers(self, row, column):
+        """Chart rows have the viewers in the viewers cell. Rows without
+        it are kept so they show up in the diagnostics.
+        """
+        cells = get_cells(row)
+        return len(cells) <= column or bool(cells[column].string)
 
     def fetch_entries(self):
-        """Fetch data and parse it to build a list of broadcast entries."""
-        current_time = ''
-
-        data = []
-        for row in self.get_rows():
-            # Stop fetching data if limit has been met
-            if exceeded_limit(self.limit, len(data)):
-                break
-
-            entry = row.find_all('td')
-            entry_dict = {}
+        """Parse every row to build a list of broadcast entries.
+        The network averages are extracted in the same pass.
+        """
+        rows, networks, cells = self._scan_page()
 
-            show_time = entry[0].string
-            if show_time and show_time != current_time:
-                current_time = show_time
-            if not show_time:
-                show_time = current_time
-            entry_dict['time'] = show_time
+        try:
+            self.network_averages = self._parse_averages(networks, cells)
+        except (IndexError, AttributeError, TypeError):
+            self.network_averages = ()
+
+        # Shows in the same time slot leave the time cell empty
+        self._current_time = ''
+        data = self._parse_rows(rows)
+        del self._current_time
+        return data
 
-            show_string = entry[1].string.split('(')
-            show = show_string[0][:-1]
-            net = self._get_net(show_string)
-            if not self._match_query(show, net):
-                continue
+    def _parse_row(self, entry):
+        """Get the fields of a broadcast entry from the cells of a row"""
+        entry_dict = {}
 
-            entry_dict['show'] = show
-            entry_dict['net'] = net
-            entry_dict['viewers'] = entry[3].string.strip('*')
-            entry_dict['rating'], entry_dict['share'] = self._get_rating(entry)
+        show_time = entry[0].string
+        if show_time and show_time != self._current_time:
+            self._current_time = show_time
+        if not show_time:
+            show_time = self._current_time
+        entry_dict['time'] = show_time
 
-            # Add data to initialize broadcast entry
-            data.append(Entry(**entry_dict))
+        show_string = entry[1].string.split('(')
+        entry_dict['show'] = show_string[0][:-1]
+        entry_dict['net'] = self._get_net(show_string)
+        entry_dict['viewers'] = entry[3].string.strip('*')
+        entry_dict['rating'], entry_dict['share'] = self._get_rating(entry)
 
-        return data
+        return entry_dict
 
     def get_averages(self):
         """Get the broadcast network averages for that day.
@@ -431,22 +674,32 @@ class Broadcast(Ratings):
         key: network name
         value: sub-dictionary with 'viewers', 'rating', and 'share' as keys
         """
-        networks = [unescape_html(n.string) for n in self.soup.find_all('td', width='77')]
-        table = self.soup.find_all('td', style=re.compile('^font'))
+        averages = {}
+        for average in self.network_averages or ():
+            averages[average.network] = {
+                'viewer': average.viewers,
+                'rating': average.rating,
+                'share': average.share
+            }
+        return averages
+
+    def _parse_averages(self, networks, cells):
+        """Build the network averages from the cells of the averages table."""
+        names = [unescape_html(n.string) for n in networks]
 
         # Each element is a list split as [rating, share]
-        rateshares = [r.string.split('/') for r in table[:5] if r.string]
-        viewers = [v.string for v in table[5:] if v.string]
-        averages = {}
+        rateshares = [r.string.split('/') for r in cells[:5] if r.string]
+        viewers = [v.string for v in cells[5:] if v.string]
+        averages = []
 
-        # Load the averages dict
-        for index, network in enumerate(networks):
-            viewer = convert_float(unescape_html(viewers[index]))
-            rating = convert_float(unescape_html(rateshares[index][0]))
-            share = convert_float(unescape_html(rateshares[index][1]))
-            averages[network] = {'viewer': viewer, 'rating': rating, 'share': share}
+        for index, network in enumerate(names):
+            averages.append(NetworkAverage(
+                to_interned(network),
+                convert_float(unescape_html(viewers[index])),
+                convert_float(unescape_html(rateshares[index][0])),
+                convert_float(unescape_html(rateshares[index][1]))))
 
-        return averages
+        return tuple(averages)
 
     def _get_net(self, entry):
         """Get the network for a specific row"""
@@ -463,3 +716,48 @@ class Broadcast(Ratings):
             r_info += string
         rating, share = r_info.split('/')
         return (rating, share.strip('*'))
+
+
+def set_retention(policy):
+    """Set what ratings objects keep of their page after parsing, unless
+    created with their own retain argument.
+
+    :param policy: 'soup' keeps the parsed page (default), 'html' keeps the
+                   page compressed and parses it again when soup is used,
+                   'none' keeps only the title, entries and averages.
+    """
+    global _retention
+    _retention = get_retention(policy)
+
+
+def get_retention(policy=None):
+    """Return the retention policy of a new ratings object.
+    Raises ValueError if the policy is not valid.
+
+    :param policy: 'soup', 'html' or 'none'. Default - see set_retention.
+    """
+    if policy is None:
+        return _retention
+    if policy not in RETENTION_POLICIES:
+        raise ValueError('%s is not a valid retention policy.' % policy)
+    return policy
+
+
+def build_ratings(category, date=None, **kwargs):
+    """Build the ratings object for a category: cable, final or tv."""
+    if category == 'cable':
+        return Cable(date, **kwargs)
+    elif category in ['final', 'tv']:
+        return Broadcast(date, final=category == 'final', **kwargs)
+    else:
+        raise ValueError('%s is not a valid category.' % category)
+
+
+def ratings_from_html(category, html, date=None, **kwargs):
+    """Parse a downloaded page for a category: cable, final or tv."""
+    if category == 'cable':
+        return Cable.from_html(html, date, **kwargs)
+    elif category in ['final', 'tv']:
+        return Broadcast.from_html(html, date, final=category == 'final', **kwargs)
+    else:
+        raise ValueError('%s is not a valid category.' % category)
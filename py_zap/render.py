@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+
+# Row layouts: (network column width, show the share column)
+LAYOUTS = {
+    'cable': (16, False),
+    'final': (7, True),
+    'tv': (7, True)
+}
+
+TITLES = {
+    'cable': 'Cable Ratings',
+    'final': 'Final Broadcast Ratings',
+    'tv': 'Fast Affiliate Broadcast Ratings'
+}
+
+
+def get_row_parts(width, share):
+    """Return the format strings of the parts of a chart row."""
+    parts = ['|{0:<30.30s}|{1:>10s}|', '{2:>%d.%d}|' % (width, width),
+             '{3:7.2f}|{4:7.1f}|']
+    if share:
+        parts.append('{5:7.1f}|')
+    return parts
+
+
+def get_row_format(width, share):
+    """Return the format string of a chart row."""
+    return ''.join(get_row_parts(width, share))
+
+
+class TableRenderer(object):
+    """Renders ratings charts as text tables, one row at a time."""
+
+    def __init__(self, category):
+        """The header and row formats are built once per category.
+
+        :param category: cable, final, or tv (non-final broadcast)
+        """
+        width, self.share = LAYOUTS[category]
+        self.category = category
+        self.row_format = get_row_format(width, self.share)
+        self.row_parts = get_row_parts(width, self.share)
+
+        if self.share:
+            self.header = '|{:<30s}|{:10s}|{:7s}|{:7s}|{:7s}|{:7s}|'.format(
+                'Show', 'Time', 'Network', 'Viewers', 'Rating', 'Share')
+            self.border = '+' + '-' * 73 + '+'
+        else:
+            self.header = '|{:<30s}|{:<10s}|{:<16s}|{:<7s}|{:<7s}|'.format(
+                'Show', 'Time', 'Network', 'Viewers', 'Rating')
+            self.border = '+' + '-' * 74 + '+'
+
+    def title(self, ratings):
+        """Return the title line of a chart"""
+        return '{0} for {1}, {2}'.format(
+            TITLES[self.category], ratings.weekday, ratings.date.title())
+
+    def format_entry(self, entry):
+        """Return the row of an entry, or None if it cannot be represented.
+        A value of the wrong type, e.g. 'n/a' viewers, ends the row before
+        its column.
+        """
+        values = entry.__dict__
+        values = (values.get('show'), values.get('time'), values.get('net'),
+                  values.get('viewers'), values.get('rating'), values.get('share'))
+        try:
+            return self.row_format.format(*values)
+        except (TypeError, ValueError):
+            pass
+
+        # Build the row part by part to find where it ends
+        row = None
+        for part in self.row_parts:
+            try:
+                text = part.format(*values)
+            except TypeError:
+                return None
+            except ValueError:
+                return row
+            row = text if row is None else row + text
+        return row
+
+    def lines(self, ratings, page_size=None):
+        """Yield each line of a chart. With a page size, the header is
+        repeated every page_size rows.
+        """
+        yield self.title(ratings)
+        yield self.header
+        yield self.border
+
+        count = 0
+        for entry in ratings:
+            row = self.format_entry(entry)
+            if row is None:
+                continue
+            if page_size and count and count % page_size == 0:
+                yield self.header
+                yield self.border
+            count += 1
+            yield row
+
+    def render(self, ratings):
+        """Return the whole chart as a string"""
+        return '\n'.join(self.lines(ratings))
+
+    def write(self, ratings, stream, page_size=None):
+        """Write a chart to a stream line by line"""
+        first = True
+        for line in self.lines(ratings, page_size=page_size):
+            if not first:
+                stream.write('\n')
+            stream.write(line)
+            first = False
+
+
+_renderers = {}
+
+
+def get_renderer(category):
+    """Return the shared renderer for a category."""
+    renderer = _renderers.get(category)
+    if renderer is None:
+        renderer = _renderers[category] = TableRenderer(category)
+    return renderer
+
+
+def write_charts(charts, stream, page_size=None):
+    """Write several charts to a stream, e.g. the days of a date range,
+    separated by blank lines.
+
+    :param charts: An iterable of Cable or Broadcast objects.
+    :param page_size: Repeat the header every page_size rows.
+    """
+    for index, ratings in enumerate(charts):
+        if index:
+            stream.write('\n\n')
+        get_renderer(ratings.category).write(ratings, stream, page_size=page_size)
+        stream.flush()
@@ -1,32 +1,35 @@
 #!/usr/bin/env python\
 
-from .constants import BASE_URL, SEARCH_URL, PAGE_ERROR
+from .constants import SEARCH_URL, PAGE_ERROR
 from .utils import PageNotFoundError, get_day, get_soup, convert_date, date_in_range
+from .urls import get_base_url
 
 class SearchDaily(object):
     """Uses the search page to search for daily ratings pages based on
     specific category and date.
     """
 
-    def __init__(self, category, date):
+    def __init__(self, category, date, session=None):
         """If requesting ratings within the last 2 days (especially on
         weekends) and page is not found, the ratings page has most likely
         not been posted yet.
 
         :param category: 'cable', broadcast', 'final' or 'tv' (non-final)
         :param date: Must be formatted as Month Date Year (e.g. January 6 2016)
+        :param session: Optional requests session shared between fetches.
         """
         self._assert_category(category)
 
         self.category = category
         self.date = date
+        self.session = session
         self.date_obj = convert_date(date)
         self.month = self.date_obj.month
         self.day = get_day(self.date_obj)
         self.year = self.date_obj.year
 
         self.url = self._build_url()
-        self.soup = get_soup(self.url)
+        self.soup = get_soup(self.url, session=self.session)
         self.results = []
 
     def get_url(self):
@@ -53,7 +56,7 @@ class SearchDaily(object):
             i += 1
 
         try:
-            page = get_soup(href)
+            page = get_soup(href, session=self.session)
         except (Exception):
             page = None
 
@@ -88,7 +91,7 @@ class SearchDaily(object):
     def _build_url(self):
         """Build url based on searching by date or by show."""
         url_params = [
-            BASE_URL, self.category + ' ratings', self.day, self.year, self.month
+            get_base_url(), self.category + ' ratings', self.day, self.year, self.month
         ]
 
         return SEARCH_URL.format(*url_params)
@@ -0,0 +1,250 @@
+#!/usr/bin/env python
+
+from .constants import FLOAT_ATTRIBUTES
+from .utils import (PageNotFoundError, to_json, match_list, get_date_info,
+                    inc_date, next_week, last_week, new_session, date_range,
+                    DATE_FMT)
+from .py_zap import build_ratings
+from .throttle import background, inherit_priority
+
+
+def get_chart(category, date, session=None):
+    """Return the unfiltered chart for a category and date, or None if the
+    page cannot be found. Only the entries are kept.
+    """
+    try:
+        return build_ratings(category, date, session=session, retain='none')
+    except PageNotFoundError:
+        return None
+
+
+class SeriesPoint(object):
+    """The ratings of a show or network for one day of a series."""
+
+    def __init__(self, date, entries):
+        """Viewers, rating and share are averaged over the matched entries and
+        are None when nothing matched on that day.
+
+        :param date: The chart date.
+        :param entries: The chart entries matching the series query.
+        """
+        self.date = date
+        self.entries = len(entries)
+
+        for attr in FLOAT_ATTRIBUTES:
+            values = [e[attr] for e in entries
+                      if isinstance(e.__dict__.get(attr), float)]
+            self.__dict__[attr] = mean(values)
+
+    def __getitem__(self, item):
+        return self.__dict__[item]
+
+    def __repr__(self):
+        return '<SeriesPoint {0}: {1} viewers>'.format(self.date, self.viewers)
+
+    def get_json(self):
+        """Represent point object as a JSON string"""
+        return to_json(self)
+
+
+class RatingsSeries(object):
+    """Walks daily or weekly ratings pages and builds a time series."""
+
+    def __init__(self, category='final', show=None, network=None,
+                 date=None, count=8, step=7, forward=False, window=4,
+                 prefetch=2, max_prefetch=8):
+        """Pages ahead of the reader are fetched in the background. The
+        prefetch depth grows while the reader has to wait on pages and
+        shrinks while fetched pages pile up unread.
+
+        :param category: cable, final, or tv (non-final broadcast)
+        :param show: Series of a specific show/list of shows.
+        :param network: Series of a specific network/list of networks.
+        :param date: The first date of the series. Default - yesterday's date.
+        :param count: Number of pages in the series.
+        :param step: 7 for a weekly series, 1 for a daily series.
+        :param forward: Walk forwards in time instead of backwards.
+        :param window: Number of points in the rolling averages.
+        :param prefetch: Initial number of pages fetched ahead.
+        :param max_prefetch: Upper bound for the prefetch depth.
+        """
+        self.category = category
+        self.show = show
+        self.network = network
+        self.date = get_date_info(date)[0]
+        self.count = count
+        self.step = step
+        self.forward = forward
+        self.window = window
+        self.prefetch = prefetch
+        self.max_prefetch = max_prefetch
+        self.dates = self._get_dates()
+        self.points = None
+
+    def __iter__(self):
+        if self.points is not None:
+            for point in self.points:
+                yield point
+            return
+
+        points = []
+        for point in self._walk():
+            self._add_stats(point, points)
+            points.append(point)
+            yield point
+        self.points = points
+
+    def __getitem__(self, item):
+        return self.get_points()[item]
+
+    def __len__(self):
+        return len(self.get_points())
+
+    def get_points(self):
+        """Fetch every page of the series and return the list of points"""
+        if self.points is None:
+            for point in self:
+                pass
+        return self.points
+
+    def get_all(self, attr):
+        """Returns a list of the requested attribute from all points"""
+        return [point[attr] for point in self.get_points()]
+
+    def get_json(self):
+        """Serialize series object as JSON-formatted string"""
+        series_dict = {
+            'category': self.category,
+            'show': self.show,
+            'network': self.network,
+            'points': self.get_points()
+        }
+        return to_json(series_dict)
+
+    def _get_dates(self):
+        """Walk the dates with the same next/last week helpers as Ratings"""
+        dates = [self.date]
+        while len(dates) < self.count:
+            date_obj = get_date_info(dates[-1])[1]
+            if self.step == 7:
+                date = next_week(date_obj) if self.forward else last_week(date_obj)
+            else:
+                num = self.step if self.forward else -self.step
+                date = inc_date(date_obj, num, DATE_FMT)
+            dates.append(date)
+        return dates
+
+    def _walk(self):
+        """Yield a point for each date while fetching pages in the background.
+        The session of the fetches is closed once the walk ends or is abandoned.
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        futures = {}
+        depth = self.prefetch
+        fetch = inherit_priority(get_chart)
+
+        with new_session() as session, \
+                ThreadPoolExecutor(max_workers=self.max_prefetch) as executor:
+            for index, date in enumerate(self.dates):
+                # Keep the next pages in flight
+                for ahead in self.dates[index:index + depth + 1]:
+                    if ahead not in futures:
+                        futures[ahead] = executor.submit(
+                            fetch, self.category, ahead, session)
+
+                future = futures.pop(date)
+                if future.done():
+                    ready = sum(1 for f in futures.values() if f.done())
+                    if ready >= depth and depth > 1:
+                        depth -= 1
+                else:
+                    depth = min(depth + 1, self.max_prefetch)
+
+                chart = future.result()
+                yield SeriesPoint(date, self._match_entries(chart))
+
+            for future in futures.values():
+                future.cancel()
+
+    def _match_entries(self, chart):
+        """Filter chart entries by the series show and network"""
+        if chart is None:
+            return []
+
+        entries = []
+        for entry in chart:
+            if self.show and not match_list(self.show, entry.show):
+                continue
+            if self.network and not match_list(self.network, entry.net):
+                continue
+            entries.append(entry)
+        return entries
+
+    def _add_stats(self, point, previous):
+        """Add rolling averages and the change since the previous point"""
+        recent = previous[-(self.window - 1):] if self.window > 1 else []
+        last = previous[-1] if previous else None
+
+        for attr in FLOAT_ATTRIBUTES:
+            values = [p[attr] for p in recent + [point] if p[attr] is not None]
+            point.__dict__['rolling_' + attr] = mean(values)
+
+            if last is None or last[attr] is None or point[attr] is None:
+                point.__dict__[attr + '_change'] = None
+            else:
+                point.__dict__[attr + '_change'] = round(point[attr] - last[attr], 2)
+
+
+def average_range(start, end, final=True, workers=4):
+    """Aggregate the broadcast network averages of every day from start to
+    end (inclusive). Only the compact averages of each day are kept.
+
+    Returns a dictionary:
+    key: network name
+    value: sub-dictionary with 'days' and, for 'viewers', 'rating' and
+           'share', a dictionary of their 'mean' and 'median'
+
+    :param final: Use final or 'fast-affiliate' ratings.
+    :param workers: Number of days fetched at the same time.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from statistics import median
+
+    category = 'final' if final else 'tv'
+
+    def day_averages(date):
+        try:
+            with background():
+                ratings = build_ratings(category, date, session=session, retain='none')
+            return ratings.network_averages or ()
+        except PageNotFoundError:
+            return ()
+
+    values = {}
+    with new_session() as session, ThreadPoolExecutor(max_workers=workers) as executor:
+        for averages in executor.map(day_averages, date_range(start, end)):
+            for average in averages:
+                network = values.setdefault(
+                    average.network, dict((attr, []) for attr in FLOAT_ATTRIBUTES))
+                for attr in FLOAT_ATTRIBUTES:
+                    value = getattr(average, attr)
+                    if isinstance(value, float):
+                        network[attr].append(value)
+
+    results = {}
+    for network, columns in values.items():
+        results[network] = {'days': max(len(v) for v in columns.values())}
+        for attr, column in columns.items():
+            results[network][attr] = {
+                'mean': mean(column),
+                'median': round(median(column), 2) if column else None
+            }
+    return results
+
+
+def mean(values):
+    """Return the rounded average of a list, or None if empty."""
+    if not values:
+        return None
+    return round(sum(values) / len(values), 2)
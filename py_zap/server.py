@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+
+'''
+Local stand-in for the ratings site, serving recorded pages so the fetch
+paths can be load-tested offline.
+
+    with StandInServer(pages, latency=0.2, error_rate=0.1) as server:
+        Cable('July 25 2017')
+'''
+
+import random
+import threading
+import time
+
+from . import urls
+from .constants import CHUNK_SIZE, DATE_FMT
+from .utils import convert_date
+
+SEARCH_RESULT = (
+    '<div class="container container-small">'
+    '<h2><a rel="bookmark" href="{url}">{title}</a></h2>'
+    '<a rel="category tag">Daily Ratings</a><time>{date}</time></div>')
+
+
+def get_path(url):
+    """Return the path and query of a url, the key pages are served by."""
+    from urllib.parse import urlsplit
+
+    parts = urlsplit(url)
+    path = parts.path or '/'
+    return path + '?' + parts.query if parts.query else path
+
+
+class StandInServer(object):
+    """Serves recorded ratings pages at the url shapes of the real site.
+
+    Urls that were not recorded get a 404, so a wrong month spelling is
+    missing the same way it is on the site. Search pages that were not
+    recorded list the recorded ratings pages of the searched category and
+    month, so the search fallback works too.
+    """
+
+    def __init__(self, pages, host='127.0.0.1', port=0, latency=0, jitter=0,
+                 error_rate=0, error_status=503, retry_after=None,
+                 throughput=None, seed=None):
+        """
+        :param pages: Dictionary of recorded url (or path) to page HTML.
+        :param port: 0 picks a free port.
+        :param latency: Seconds before each response starts.
+        :param jitter: Up to this many seconds are added to the latency.
+        :param error_rate: Share of requests answered with error_status.
+        :param retry_after: Retry-After header sent with injected errors.
+        :param throughput: Bytes per second the page bodies are sent at.
+                           None sends them at once.
+        :param seed: Seed of the latency and error injection.
+        """
+        self.pages = {}
+        for url, html in pages.items():
+            if isinstance(html, str):
+                html = html.encode('utf-8')
+            self.pages[get_path(url)] = (url, html)
+
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.retry_after = retry_after
+        self.throughput = throughput
+
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._httpd = None
+        self._thread = None
+        self._previous_url = None
+        self.requests = 0
+        self.statuses = {}
+
+    @classmethod
+    def from_archive(cls, archive, **kwargs):
+        """Serve every page of a PageArchive."""
+        return cls(dict((url, archive.get(url)) for url in archive.urls()), **kwargs)
+
+    @property
+    def url(self):
+        """The base url of the running server."""
+        return 'http://{0}:{1}'.format(self.host, self.port)
+
+    def start(self):
+        """Start serving in a background thread."""
+        from http.server import ThreadingHTTPServer
+
+        self._httpd = ThreadingHTTPServer((self.host, self.port), _make_handler(self))
+        self._httpd.daemon_threads = True
+        self.port = self._httpd.server_address[1]
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving."""
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._thread.join()
+            self._httpd = None
+
+    def __enter__(self):
+        """Start serving and build every url on this server. Charts are
+        cached by category and date, not by site, so the charts and url
+        knowledge of the site are dropped on the way in and out.
+        """
+        self.start()
+        self._previous_url = urls._base_url
+        urls.set_base_url(self.url)
+        clear_charts()
+        return self
+
+    def __exit__(self, *exc_info):
+        urls.set_base_url(self._previous_url)
+        clear_charts()
+        self.stop()
+
+    def respond(self, path):
+        """Return the (status, headers, body) of a request, after the
+        injected latency.
+        """
+        with self._lock:
+            delay = self.latency + self._random.uniform(0, self.jitter)
+            failed = self._random.random() < self.error_rate
+        if delay:
+            time.sleep(delay)
+
+        if failed:
+            headers = {}
+            if self.retry_after is not None:
+                headers['Retry-After'] = str(self.retry_after)
+            status, body = self.error_status, b''
+        else:
+            page = self.pages.get(path)
+            if page is None and path.startswith('/?s='):
+                page = (path, self.search_page(path))
+            status, body = (200, page[1]) if page else (404, b'Not Found')
+            headers = {'Content-Type': 'text/html; charset=utf-8'}
+
+        with self._lock:
+            self.requests += 1
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+        return status, headers, body
+
+    def search_page(self, path):
+        """Build a search results page listing the recorded ratings pages of
+        the searched category, year and month.
+        """
+        from urllib.parse import urlsplit, parse_qs
+
+        query = parse_qs(urlsplit(path).query, keep_blank_values=True)
+        words = query.get('s', [''])[0].lower().split()
+        year, month = query.get('year', [''])[0], query.get('monthnum', [''])[0]
+
+        results = []
+        for url, _ in sorted(self.pages.values()):
+            info = urls.parse_url(url)
+            if info is None or not words or info[0] != words[0]:
+                continue
+
+            date_obj = convert_date(info[1])
+            if str(date_obj.year) != year or str(date_obj.month) != month:
+                continue
+            results.append(SEARCH_RESULT.format(
+                url=self.url + get_path(url),
+                title='{0} {1} ratings'.format(info[1], info[0]),
+                date=date_obj.strftime(DATE_FMT)))
+
+        return ('<html><body>%s</body></html>' % ''.join(results)).encode('utf-8')
+
+    def send_body(self, stream, body):
+        """Write a body, throttled to the configured throughput."""
+        if not self.throughput:
+            stream.write(body)
+            return
+
+        for start in range(0, len(body), CHUNK_SIZE):
+            chunk = body[start:start + CHUNK_SIZE]
+            time.sleep(len(chunk) / float(self.throughput))
+            stream.write(chunk)
+            stream.flush()
+
+
+def clear_charts():
+    """Forget the cached charts and the found and missing urls."""
+    from .cache import chart_cache
+
+    chart_cache.clear()
+    urls.url_knowledge.clear()
+
+
+def _make_handler(server):
+    """Return the request handler class of a stand-in server."""
+    from http.server import BaseHTTPRequestHandler
+
+    class StandInHandler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            status, headers, body = server.respond(self.path)
+            try:
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                server.send_body(self.wfile, body)
+            except (BrokenPipeError, ConnectionResetError):
+                # The client stopped reading, e.g. after a failed title check
+                pass
+
+        def log_message(self, format, *args):
+            pass
+
+    return StandInHandler
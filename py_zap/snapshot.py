@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+
+from .constants import PAGE_ERROR
+from .utils import PageNotFoundError, get_date_info, new_session
+from .py_zap import Cable, Broadcast
+from .throttle import inherit_priority
+
+
+class DailySnapshot(object):
+    """Fetches the cable, final and fast broadcast charts for a single day."""
+
+    categories = ['final', 'tv', 'cable']
+
+    def __init__(self, date=None, show=None, network=None, limit=None,
+                 workers=3):
+        """All three charts are requested in parallel over a shared session.
+        A chart that cannot be found is recorded in ``errors`` instead of
+        failing the whole snapshot.
+
+        :param date: Default - yesterday's date.
+        :param show: Will only fetch data of a specific show.
+        :param network: Will only fetch data of a specific network.
+        :param limit: Will stop fetching data once the limit has been reached.
+        :param workers: Number of charts fetched at the same time.
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        self.date, self.date_obj, self.weekday = get_date_info(date)
+        self.charts = {}
+        self.errors = {}
+
+        params = (self.date, show, network, limit)
+        broadcast = inherit_priority(Broadcast)
+        cable = inherit_priority(Cable)
+        with new_session() as session, ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                'final': executor.submit(
+                    broadcast, *params, final=True, session=session),
+                'tv': executor.submit(
+                    broadcast, *params, final=False, session=session),
+                'cable': executor.submit(
+                    cable, *params, session=session)
+            }
+
+            for category in self.categories:
+                try:
+                    self.charts[category] = futures[category].result()
+                except PageNotFoundError as e:
+                    self.errors[category] = e
+
+        if not self.charts:
+            raise PageNotFoundError(PAGE_ERROR)
+
+        self.cable = self.charts.get('cable')
+        self.final = self.charts.get('final')
+        self.fast = self.charts.get('tv')
+        self.entries = self._merge_entries()
+        self.averages = self._get_averages()
+
+    def __iter__(self):
+        for entry in self.entries:
+            yield entry
+
+    def __getitem__(self, item):
+        return self.entries[item]
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get_date(self):
+        """Get the snapshot date"""
+        return self.date
+
+    def get_averages(self):
+        """Get the broadcast network averages for that day"""
+        return self.averages
+
+    def _merge_entries(self):
+        """Merge the entries of every chart, dropping duplicate rows.
+        Final broadcast rows take precedence over fast affiliate rows.
+        """
+        seen = set()
+        entries = []
+
+        for category in self.categories:
+            ratings = self.charts.get(category)
+            if ratings is None:
+                continue
+
+            for entry in ratings:
+                key = (entry.key, str(entry.net).lower(), str(entry.time).lower())
+                if key not in seen:
+                    seen.add(key)
+                    entries.append(entry)
+
+        return entries
+
+    def _get_averages(self):
+        """Network averages from the final chart, falling back to fast ratings"""
+        for ratings in [self.final, self.fast]:
+            if ratings is not None and ratings.network_averages:
+                return ratings.get_averages()
+        return {}
@@ -0,0 +1,235 @@
+#!/usr/bin/env python
+
+import heapq
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+
+from .constants import (HEADERS, RATE_LIMIT, RATE_BURST, REQUEST_TIMEOUT,
+                        REQUEST_RETRIES, RETRY_BACKOFF)
+
+# Lower values are served first
+INTERACTIVE = 0
+BACKGROUND = 10
+
+RETRY_STATUSES = [429, 500, 502, 503, 504]
+
+_local = threading.local()
+
+
+@contextmanager
+def priority(level):
+    """Set the request priority for fetches made by the current thread.
+
+    >>> with priority(BACKGROUND):
+    ...     Cable('July 25 2017')
+    """
+    previous = getattr(_local, 'priority', INTERACTIVE)
+    _local.priority = level
+    try:
+        yield
+    finally:
+        _local.priority = previous
+
+
+def background():
+    """Mark fetches made by the current thread as background work."""
+    return priority(BACKGROUND)
+
+
+def current_priority():
+    """Return the request priority of the current thread."""
+    return getattr(_local, 'priority', INTERACTIVE)
+
+
+def inherit_priority(func):
+    """Wrap a function so it runs with the priority of the calling thread.
+    Used for work handed to thread pools.
+    """
+    level = current_priority()
+
+    def run(*args, **kwargs):
+        with priority(level):
+            return func(*args, **kwargs)
+    return run
+
+
+class TokenBucket(object):
+    """Allows `rate` requests per second with bursts of up to `burst`."""
+
+    def __init__(self, rate, burst):
+        """
+        :param rate: Requests per second. None disables the limit.
+        :param burst: Maximum number of requests sent back to back.
+        """
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+
+    def delay(self):
+        """Seconds until the next token is available."""
+        if self.rate is None:
+            return 0
+
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+        if self.tokens >= 1:
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    def take(self):
+        """Use up a token."""
+        if self.rate is not None:
+            self.tokens -= 1
+
+
+class RequestScheduler(object):
+    """Sends every request of the scraper through a shared rate limit."""
+
+    def __init__(self, rate=RATE_LIMIT, burst=RATE_BURST, retries=REQUEST_RETRIES,
+                 backoff=RETRY_BACKOFF, timeout=REQUEST_TIMEOUT):
+        """Waiting requests are served by priority, then in arrival order.
+        429 and 5xx responses and timeouts are retried with exponential
+        backoff. A Retry-After header pauses every request, not just the one
+        that received it.
+
+        :param rate: Requests per second. None disables the limit.
+        :param burst: Maximum number of requests sent back to back.
+        :param retries: Number of retries after the first attempt.
+        :param backoff: Seconds to wait before the first retry.
+        :param timeout: Seconds before a request times out.
+        """
+        self.bucket = TokenBucket(rate, burst)
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+
+        self._cond = threading.Condition()
+        self._waiting = []
+        self._counter = itertools.count()
+        self._paused_until = 0
+
+    def acquire(self, level=None):
+        """Block until the rate limit allows another request.
+
+        :param level: Request priority, defaults to the thread priority.
+        """
+        if level is None:
+            level = current_priority()
+        ticket = (level, next(self._counter))
+
+        with self._cond:
+            heapq.heappush(self._waiting, ticket)
+            try:
+                while True:
+                    if self._waiting[0] != ticket:
+                        self._cond.wait()
+                        continue
+
+                    pause = self._paused_until - time.monotonic()
+                    delay = max(pause, self.bucket.delay())
+                    if delay <= 0:
+                        self.bucket.take()
+                        return
+                    self._cond.wait(delay)
+            finally:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+                self._cond.notify_all()
+
+    def pause(self, seconds):
+        """Hold back every request for a number of seconds."""
+        with self._cond:
+            until = time.monotonic() + seconds
+            self._paused_until = max(self._paused_until, until)
+            self._cond.notify_all()
+
+    def fetch(self, url, session=None, level=None):
+        """Request a url, retrying temporary failures.
+
+        Returns the response, or None if the server kept failing.
+
+        :param session: Optional shared requests session.
+        :param level: Request priority, defaults to the thread priority.
+        """
+        import requests
+
+        for attempt in range(self.retries + 1):
+            wait = self.backoff * 2 ** attempt
+            self.acquire(level)
+
+            try:
+                if session is None:
+                    response = requests.get(url, stream=True, headers=HEADERS,
+                                            timeout=self.timeout)
+                else:
+                    response = session.get(url, stream=True, timeout=self.timeout)
+            except requests.Timeout:
+                if attempt == self.retries:
+                    raise
+                time.sleep(wait)
+                continue
+
+            if response.status_code not in RETRY_STATUSES:
+                return response
+
+            response.close()
+            if attempt < self.retries:
+                retry_after = get_retry_after(response)
+                if retry_after is not None:
+                    self.pause(retry_after)
+                else:
+                    time.sleep(wait)
+
+        return None
+
+
+def get_retry_after(response):
+    """Return the Retry-After header in seconds, or None if missing."""
+    value = response.headers.get('Retry-After')
+    if value is None:
+        return None
+
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        pass
+
+    from email.utils import parsedate_to_datetime
+    try:
+        retry_date = parsedate_to_datetime(value)
+        return max(retry_date.timestamp() - time.time(), 0)
+    except (TypeError, ValueError):
+        return None
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """Return the scheduler shared by every fetch."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = RequestScheduler()
+        return _scheduler
+
+
+def set_scheduler(scheduler):
+    """Replace the shared scheduler, e.g. to change the rate limit."""
+    global _scheduler
+    with _scheduler_lock:
+        _scheduler = scheduler
+
+
+def configure(**kwargs):
+    """Replace the shared scheduler with one built from keyword arguments.
+
+    >>> configure(rate=1.0, burst=2, retries=5)
+    """
+    set_scheduler(RequestScheduler(**kwargs))
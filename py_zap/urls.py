@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+
+import os
+import re
+import threading
+import time
+from functools import lru_cache
+
+from .constants import (BASE_URL, URL_FORMAT, MONTHS, SHORT_MONTHS, WEEKDAYS,
+                        MISSING_URL_TTL, DATE_FMT)
+
+# Month spelling used in urls, indexed by [shorten][month number - 1].
+# September is always spelled out for cable and always 'sept' for broadcast,
+# the same as convert_month.
+URL_MONTHS = {
+    'cable': {
+        True: SHORT_MONTHS[:8] + ['september'] + SHORT_MONTHS[9:],
+        False: list(MONTHS)
+    },
+    'broadcast': {
+        True: list(SHORT_MONTHS),
+        False: MONTHS[:8] + ['sept'] + MONTHS[9:]
+    }
+}
+
+# Overrides BASE_URL and the PY_ZAP_BASE_URL environment variable, see set_base_url
+_base_url = None
+
+# Month number of every spelling used in urls
+URL_MONTH_NUMBERS = dict(
+    (name, number + 1)
+    for spellings in URL_MONTHS.values()
+    for names in spellings.values()
+    for number, name in enumerate(names))
+
+# Slug of a ratings page url, e.g. tuesday-final-ratings-july-25-2017 or
+# tv-ratings-tuesday-july-25-2017
+RATINGS_SLUG = re.compile(
+    r'/daily-ratings/(?:[a-z]+-)?(cable|final|tv)-ratings-(?:[a-z]+-)?'
+    r'([a-z]+)-(\d{1,2})-(\d{4})/?$')
+
+
+def get_base_url():
+    """Return the site urls are built on: the url given to set_base_url,
+    otherwise the PY_ZAP_BASE_URL environment variable, otherwise BASE_URL.
+    """
+    base_url = _base_url or os.environ.get('PY_ZAP_BASE_URL') or BASE_URL
+    return base_url.rstrip('/')
+
+
+def set_base_url(url):
+    """Build urls on another site, e.g. a local stand-in server.
+    None goes back to the environment variable or BASE_URL.
+    """
+    global _base_url
+    _base_url = url
+
+
+def url_segments(category, weekday):
+    """Return the weekday and category url segments in page order.
+    Fast ratings urls put the category before the weekday.
+    """
+    if category == 'tv':
+        return category + '-ratings', weekday
+    return weekday, category + '-ratings'
+
+
+def build_url(category, date_obj, shorten=True):
+    """Build the ratings page url of a category and date.
+
+    :param date_obj: The page date as a datetime object.
+    :param shorten: Use the short month name.
+    """
+    return _build_url(category, date_obj, shorten, get_base_url())
+
+
+@lru_cache(maxsize=4096)
+def _build_url(category, date_obj, shorten, base_url):
+    months = URL_MONTHS['cable' if category == 'cable' else 'broadcast'][shorten]
+    url_date = '{0}-{1}-{2}'.format(
+        months[date_obj.month - 1], date_obj.day, date_obj.year)
+    first, second = url_segments(category, WEEKDAYS[date_obj.weekday()])
+    return URL_FORMAT.format(base_url, first, second, url_date)
+
+
+def candidate_urls(category, date_obj):
+    """Return every url a ratings page may be posted at, most likely first.
+    Months with a single spelling only have one url.
+    """
+    return _candidate_urls(category, date_obj, get_base_url())
+
+
+@lru_cache(maxsize=4096)
+def _candidate_urls(category, date_obj, base_url):
+    urls = [_build_url(category, date_obj, True, base_url)]
+    long_url = _build_url(category, date_obj, False, base_url)
+    if long_url not in urls:
+        urls.append(long_url)
+    return tuple(urls)
+
+
+def parse_url(url):
+    """Return the (category, date) of a ratings page url, or None if the url
+    is not a ratings page (e.g. a search page).
+    """
+    from datetime import datetime
+
+    match = RATINGS_SLUG.search(url.lower())
+    if match is None:
+        return None
+
+    category, month, day, year = match.groups()
+    month = URL_MONTH_NUMBERS.get(month)
+    if month is None:
+        return None
+    try:
+        date_obj = datetime(int(year), month, int(day))
+    except ValueError:
+        return None
+    return category, date_obj.strftime(DATE_FMT)
+
+
+class UrlKnowledge(object):
+    """Remembers which urls were found and which were missing, so repeated
+    fetches try known pages first and skip known misses.
+    """
+
+    def __init__(self, missing_ttl=MISSING_URL_TTL):
+        """
+        :param missing_ttl: Seconds a missing url is skipped, since pages for
+                            recent days may still be posted.
+        """
+        self.missing_ttl = missing_ttl
+        self._lock = threading.Lock()
+        self._found = set()
+        self._missing = {}
+
+    def record(self, url, found):
+        """Record whether a page was found at a url."""
+        with self._lock:
+            if found:
+                self._found.add(url)
+                self._missing.pop(url, None)
+            else:
+                self._missing[url] = time.monotonic()
+
+    def is_missing(self, url):
+        """Return True if the url was recently found missing."""
+        with self._lock:
+            missing_since = self._missing.get(url)
+            if missing_since is None:
+                return False
+            if time.monotonic() - missing_since > self.missing_ttl:
+                del self._missing[url]
+                return False
+            return True
+
+    def order(self, urls):
+        """Return the urls worth trying, known pages first."""
+        urls = [url for url in urls if not self.is_missing(url)]
+        with self._lock:
+            return sorted(urls, key=lambda url: url not in self._found)
+
+    def clear(self):
+        with self._lock:
+            self._found.clear()
+            self._missing.clear()
+
+
+# Shared by every Ratings object
+url_knowledge = UrlKnowledge()
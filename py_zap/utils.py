@@ -1,15 +1,17 @@
 #!/usr/bin/env python
 from __future__ import print_function, absolute_import
 
-import json
-import requests
-import calendar
 import sys
 from datetime import datetime, timedelta
+from functools import lru_cache
 
-from bs4 import BeautifulSoup
+# requests, bs4, json and calendar are imported on first use to keep
+# importing py_zap fast
 
-from .constants import HEADERS, MONTHS, SHORT_MONTHS, DATE_FMT
+from .constants import (HEADERS, MONTHS, SHORT_MONTHS, DATE_FMT, CHUNK_SIZE,
+                        VERIFY_MAX_BYTES)
+from .throttle import get_scheduler
+from .singleflight import SingleFlight
 
 if sys.version_info[0] == 3:
     PY3 = True
@@ -29,6 +31,7 @@ class PageNotFoundError(Exception):
 
 def to_json(data):
     """Return data as a JSON string."""
+    import json
     return json.dumps(data, default=lambda x: x.__dict__, sort_keys=True, indent=4)
 
 def convert_string(string, chars=None):
@@ -94,8 +97,29 @@ def convert_date(date):
     clean_string = convert_string(date)
     return datetime.strptime(clean_string, DATE_FMT.replace('-',''))
 
+def yesterday():
+    """Return yesterday's date as a string."""
+    return (datetime.today() - timedelta(days=1)).strftime(DATE_FMT)
+
+def get_date_info(date=None):
+    """Return the cleaned date string, date object and weekday name.
+
+    :param date: Default - yesterday's date.
+    """
+    if date is None:
+        date = yesterday()
+    return _date_info(date)
+
+@lru_cache(maxsize=512)
+def _date_info(date):
+    """Cached so that several charts for the same day only parse the date once."""
+    clean_date = convert_string(date)
+    date_obj = convert_date(clean_date)
+    return clean_date, date_obj, get_day(date_obj)
+
 def get_day(date_obj):
     """Get the name of the day based on the date object."""
+    import calendar
     return calendar.day_name[date_obj.weekday()]
 
 def date_in_range(date1, date2, range):
@@ -110,6 +134,16 @@ def inc_date(date_obj, num, date_fmt):
     """
     return (date_obj + timedelta(days=num)).strftime(date_fmt)
 
+def date_range(start, end, step=1):
+    """Return the date strings from start to end (inclusive).
+
+    :param step: Number of days between each date.
+    """
+    start_obj = get_date_info(start)[1]
+    end_obj = get_date_info(end)[1]
+    days = (end_obj - start_obj).days
+    return [inc_date(start_obj, num, DATE_FMT) for num in range(0, days + 1, step)]
+
 def next_week(date_obj):
     """Return 7 days after the date object."""
     return inc_date(date_obj, 7, DATE_FMT)
@@ -124,13 +158,100 @@ def last_week(date_obj):
 # Parsing helpers
 #----------------------------------------------------------
 
-def get_soup(url):
-    """Request the page and return the soup."""
-    html = requests.get(url, stream=True, headers=HEADERS)
-    if html.status_code != 404:
-        return BeautifulSoup(html.content, 'html.parser')
-    else:
-        return None
+def new_session():
+    """Return a requests session that can be shared between fetches."""
+    import requests
+    session = requests.Session()
+    session.headers.update(HEADERS)
+    return session
+
+_soup_flights = SingleFlight()
+
+# Optional on-disk cache of downloaded pages, see set_page_cache
+page_cache = None
+
+def set_page_cache(cache):
+    """Store downloaded pages in a PageCache, or None to disable."""
+    global page_cache
+    page_cache = cache
+
+def get_soup(url, session=None, priority=None, verify=None):
+    """Request the page through the shared scheduler and return the soup,
+    or None if it could not be fetched.
+    Concurrent requests for the same url share a single download and parse.
+
+    :param session: Optional shared requests session.
+    :param priority: Request priority, defaults to the thread priority.
+    :param verify: Optional check of the start of the page, see read_page.
+    """
+    return fetch_page(url, session, priority, verify)[1]
+
+def fetch_page(url, session=None, priority=None, verify=None):
+    """Like get_soup, but return (status, soup). The status is the HTTP
+    status code, or None if the scheduler gave up. The soup is None if the
+    page was not found, the request failed or the page check failed.
+    """
+    return _soup_flights.do(url, _fetch_soup, url, session, priority, verify)
+
+def _fetch_soup(url, session, priority, verify):
+    """Download and parse a page, returning (status, soup)."""
+    if page_cache is not None:
+        content = page_cache.get(url)
+        if content is not None:
+            return 200, parse_html(content)
+
+    html = get_scheduler().fetch(url, session=session, level=priority)
+    if html is None:
+        return None, None
+    if html.status_code == 404:
+        return 404, None
+
+    content = read_page(html, verify)
+    if content is None:
+        return html.status_code, None
+
+    if page_cache is not None and html.status_code == 200:
+        page_cache.set(url, content)
+    return html.status_code, parse_html(content)
+
+def read_page(response, verify=None):
+    """Read a streamed response, checking the start of the page as it
+    arrives. Returns the page content, or None if the check failed.
+
+    :param verify: Called with the text read so far. Returns False to abort
+                   the download, True to accept the page or None to keep
+                   checking.
+    """
+    if verify is None:
+        return response.content
+
+    chunks = []
+    size = 0
+    checking = True
+
+    for chunk in response.iter_content(CHUNK_SIZE):
+        chunks.append(chunk)
+        size += len(chunk)
+
+        if checking:
+            head = b''.join(chunks).decode('utf-8', 'replace')
+            result = verify(head)
+            if result is False:
+                response.close()
+                return None
+            checking = result is None and size < VERIFY_MAX_BYTES
+
+    return b''.join(chunks)
+
+def parse_html(html):
+    """Parse a page into a soup."""
+    from bs4 import BeautifulSoup
+    return BeautifulSoup(html, 'html.parser')
+
+def get_cells(row):
+    """Return the cells of a table row, walking only its direct children."""
+    return [child for child in row.children if child.name == 'td']
+
 
 def match_list(query_list, string):
     """Return True if all words in a word list are in the string.
@@ -185,6 +306,12 @@ def get_strings(soup, tag):
     strings = [s.string for s in tags if s.string]
     return strings
 
+def to_list(value):
+    """Wrap a single value in a list. None is returned unchanged."""
+    if value is None or isinstance(value, list):
+        return value
+    return [value]
+
 def exceeded_limit(limit, length):
     """Check if the length exceeds a limit"""
     return True if limit and length >= limit else False
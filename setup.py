@@ -18,6 +18,9 @@ setup(
     keywords=['zap2it', 'ratings', 'tv'],
     license='MIT License',
     packages=['py_zap'],
+    entry_points={
+        'console_scripts': ['py-zap=py_zap.cli:main']
+    },
     install_requires=[
         'beautifulsoup4',
         'requests>=2.9.1'
@@ -1,3 +1,12 @@
+import io
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import sys
+import threading
+import time
 import unittest
 from datetime import datetime
 
@@ -7,7 +16,120 @@ import json
 from py_zap.constants import BASE_URL, DATE_FMT
 import py_zap.utils as u
 from py_zap.search import SearchDaily
-from py_zap import Cable, Broadcast
+from py_zap import Cable, Broadcast, DailySnapshot
+from py_zap.diff import RatingsDiff, diff_range
+from py_zap.series import RatingsSeries, average_range
+from py_zap import throttle
+from py_zap.singleflight import SingleFlight
+from py_zap.cache import chart_cache, PageCache
+from py_zap import cli
+from py_zap.render import write_charts
+from py_zap import urls
+from py_zap.normalize import normalize_row, show_key
+from py_zap.bench import measure_memory, time_stages, format_timings, rows_per_second
+from py_zap.archive import PageArchive
+from py_zap.server import StandInServer
+from py_zap.index import ShowIndex
+from py_zap.layout import layouts, get_title_strings
+from py_zap.backfill import BackfillQueue, run_worker
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+import requests
+
+
+CABLE_PAGE = (
+    '<html><body><p><strong>Tuesday cable ratings: July 25, 2017</strong></p>'
+    '<table>'
+    '<tr><td>Show</td><td>Net</td><td>Time</td><td>Viewers</td><td>Rating</td></tr>'
+    '<tr><td>Rick and Morty</td><td>ADSM</td><td>11:30 PM</td><td>1,512</td><td>0.87</td></tr>'
+    '<tr><td>Teen Mom 2</td><td>MTV</td><td>9:00 PM</td><td>1,023</td><td>0.56</td></tr>'
+    '<tr><td>Tucker Carlson Tonight</td><td>FNC</td><td>8:00 PM</td><td>987</td><td>0.19</td></tr>'
+    '</table></body></html>'
+)
+
+BROADCAST_AVERAGES = (
+    '<table>'
+    '<tr><td width="77">NBC</td><td width="77">ABC</td><td width="77">CBS</td>'
+    '<td width="77">FOX</td><td width="77">CW</td></tr>'
+    '<tr><td style="font-weight:bold">1.7/7</td><td style="font-weight:bold">1.1/4</td>'
+    '<td style="font-weight:bold">0.8/3</td><td style="font-weight:bold">0.9/4</td>'
+    '<td style="font-weight:bold">0.3/1</td></tr>'
+    '<tr><td style="font-weight:bold">8.94</td><td style="font-weight:bold">4.31</td>'
+    '<td style="font-weight:bold">4.58</td><td style="font-weight:bold">2.77</td>'
+    '<td style="font-weight:bold">1.05</td></tr>'
+    '</table>'
+)
+
+FINAL_PAGE = (
+    '<html><body><p><b>Final broadcast ratings for Tuesday, July 25, 2017</b></p>'
+    '<table>'
+    '<tr><td>Time</td><td>Show</td><td>Rating/Share</td><td>Viewers</td></tr>'
+    '<tr><td>8 p.m.</td><td>America\'s Got Talent (NBC)</td><td>2.0/8</td><td>11.52</td></tr>'
+    '<tr><td></td><td>Bachelor in Paradise (ABC)</td><td>1.3/<i>5*</i></td><td>4.92*</td></tr>'
+    '<tr><td>9 p.m.</td><td>NCIS (CBS)</td><td>0.9/4</td><td>6.60</td></tr>'
+    '<tr><td>10 p.m.</td><td>Somewhere Between (ABC)</td><td>0.6/2</td><td>3.02</td></tr>'
+    '</table>' + BROADCAST_AVERAGES + '</body></html>'
+)
+
+FAST_PAGE = (
+    '<html><body><p><b>Tuesday fast affiliate ratings: July 25, 2017</b></p>'
+    '<table>'
+    '<tr><td>Time</td><td>Show</td><td>Rating/Share</td><td>Viewers</td></tr>'
+    '<tr><td>8 p.m.</td><td>America\'s Got Talent (NBC)</td><td>1.9/8</td><td>11.21</td></tr>'
+    '<tr><td></td><td>Bachelor in Paradise (ABC)</td><td>1.3/5</td><td>4.87</td></tr>'
+    '<tr><td>9 p.m.</td><td>NCIS (CBS)</td><td>0.8/3</td><td>6.41</td></tr>'
+    '</table>' + BROADCAST_AVERAGES + '</body></html>'
+)
+
+DAILY_URL = BASE_URL + '/daily-ratings/{0}/'
+FIXTURE_PAGES = {
+    DAILY_URL.format('tuesday-cable-ratings-july-25-2017'): CABLE_PAGE,
+    DAILY_URL.format('tuesday-final-ratings-july-25-2017'): FINAL_PAGE,
+    DAILY_URL.format('tv-ratings-tuesday-july-25-2017'): FAST_PAGE,
+    DAILY_URL.format('tuesday-final-ratings-aug-1-2017'): FINAL_PAGE.replace(
+        'July 25, 2017', 'August 1, 2017').replace('11.52', '10.80'),
+}
+
+
+def fixture_response(request, **kwargs):
+    """Answer a request from the recorded fixture pages instead of the network"""
+    response = requests.Response()
+    response.url = request.url
+    response.request = request
+    response.raw = None
+    response._content_consumed = True
+
+    page = FIXTURE_PAGES.get(request.url)
+    if page is None:
+        response.status_code = 404
+        response._content = b''
+    else:
+        response.status_code = 200
+        response._content = page.encode('utf-8')
+    return response
+
+
+def offline():
+    """Patch requests so that only the fixture pages are reachable"""
+    return mock.patch('requests.Session.send', side_effect=fixture_response)
+
+
+def status_response(status, headers=None):
+    """Build an empty response with a status code"""
+    response = requests.Response()
+    response.status_code = status
+    response.headers.update(headers or {})
+    response.raw = None
+    response._content_consumed = True
+    response._content = b''
+    return response
+
+
+# Fixture pages are served locally, so the politeness limit is not needed
+throttle.configure(rate=None)
 
 
 
@@ -141,6 +263,1002 @@ class TestCableNetFilter(unittest.TestCase):
         for entry in self.ratings:
             self.assertTrue(u.match_list(self.networks, entry.net))
 
+
+class TestDailySnapshot(unittest.TestCase):
+
+    def setUp(self):
+        chart_cache.clear()
+        with offline():
+            self.snapshot = DailySnapshot('July 25 2017')
+
+    def test_fetches_all_categories(self):
+        """Test a snapshot fetches cable, final and fast charts"""
+        self.assertEqual(len(self.snapshot.cable), 3)
+        self.assertEqual(len(self.snapshot.final), 4)
+        self.assertEqual(len(self.snapshot.fast), 3)
+        self.assertEqual(self.snapshot.weekday, 'Tuesday')
+
+    def test_merged_entries(self):
+        """Test fast rows already in the final chart are deduplicated"""
+        self.assertEqual(len(self.snapshot), 7)
+        self.assertEqual(self.snapshot[0].viewers, 11.52)
+
+    def test_averages(self):
+        """Test snapshot includes the broadcast network averages"""
+        averages = self.snapshot.get_averages()
+        self.assertEqual(averages['NBC']['viewer'], 8.94)
+        self.assertEqual(len(averages), 5)
+
+    def test_session_closed(self):
+        """Test the shared session is closed once the charts are fetched"""
+        chart_cache.clear()
+        with offline(), mock.patch.object(requests.Session, 'close') as close:
+            DailySnapshot('July 25 2017')
+        self.assertEqual(close.call_count, 1)
+
+class TestRatingsDiff(unittest.TestCase):
+
+    def setUp(self):
+        with offline():
+            self.diff = RatingsDiff('July 25 2017')
+
+    def test_matched_deltas(self):
+        """Test fast and final entries are joined with their deltas"""
+        self.assertEqual(len(self.diff), 3)
+        delta = self.diff[0]
+        self.assertEqual(delta.show, 'America\'s Got Talent')
+        self.assertEqual(delta.viewers, 0.31)
+        self.assertEqual(delta.rating, 0.1)
+
+    def test_unmatched_entries(self):
+        """Test final entries missing from the fast chart are reported"""
+        self.assertEqual(len(self.diff.unmatched_final), 1)
+        self.assertEqual(len(self.diff.unmatched_fast), 0)
+
+    def test_diff_range(self):
+        """Test days without charts are skipped and the session is closed"""
+        with offline():
+            with mock.patch.object(requests.Session, 'close') as close:
+                diffs = diff_range('July 24 2017', 'July 26 2017')
+        self.assertEqual([diff.date for diff in diffs], ['July 25 2017'])
+        self.assertEqual(close.call_count, 1)
+
+class TestRatingsSeries(unittest.TestCase):
+
+    def setUp(self):
+        chart_cache.clear()
+        with offline():
+            self.series = RatingsSeries(
+                'final', network='NBC', date='August 1 2017', count=3)
+            self.points = self.series.get_points()
+
+    def test_weekly_dates(self):
+        """Test a weekly series walks backwards one week at a time"""
+        self.assertEqual(self.series.get_all('date'),
+                         ['August 1 2017', 'July 25 2017', 'July 18 2017'])
+
+    def test_point_values(self):
+        """Test points hold the matched values and missing weeks are None"""
+        self.assertEqual(self.series.get_all('viewers'), [10.8, 11.52, None])
+
+    def test_rolling_stats(self):
+        """Test rolling averages and week over week change"""
+        self.assertEqual(self.points[1].rolling_viewers, 11.16)
+        self.assertEqual(self.points[1].viewers_change, 0.72)
+        self.assertEqual(self.points[2].viewers_change, None)
+
+    def test_session_closed(self):
+        """Test the session is closed when a walk ends or is abandoned"""
+        with offline(), mock.patch.object(requests.Session, 'close') as close:
+            RatingsSeries('final', date='August 1 2017', count=2).get_points()
+            walk = iter(RatingsSeries('final', date='August 1 2017', count=3))
+            next(walk)
+            walk.close()
+        self.assertEqual(close.call_count, 2)
+
+    def test_shared_charts(self):
+        """Test series share the chart cache and keep no pages"""
+        chart = chart_cache.get(('final', 'August 1 2017'))
+        self.assertEqual(chart.html, None)
+
+        # A day that was missing is looked up again by a later series
+        urls.url_knowledge.clear()
+        page = FINAL_PAGE.replace('July 25, 2017', 'July 18, 2017')
+        url = DAILY_URL.format('tuesday-final-ratings-july-18-2017')
+        with offline(), mock.patch.dict(FIXTURE_PAGES, {url: page}):
+            series = RatingsSeries('final', network='NBC', date='July 18 2017', count=1)
+            self.assertEqual(series.get_all('viewers'), [11.52])
+        urls.url_knowledge.clear()
+
+class TestRequestScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.scheduler = throttle.RequestScheduler(rate=None, retries=2, backoff=0)
+
+    def test_token_bucket(self):
+        """Test the bucket allows a burst and then waits for new tokens"""
+        bucket = throttle.TokenBucket(rate=1.0, burst=2)
+        for _ in range(2):
+            self.assertEqual(bucket.delay(), 0)
+            bucket.take()
+        self.assertTrue(0 < bucket.delay() <= 1)
+
+    def test_retry_after(self):
+        """Test a 429 response is retried after the Retry-After delay"""
+        responses = [status_response(429, {'Retry-After': '0'}), status_response(200)]
+        with mock.patch('requests.Session.send', side_effect=responses) as send:
+            response = self.scheduler.fetch(BASE_URL)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(send.call_count, 2)
+
+    def test_gives_up(self):
+        """Test server errors are retried then reported as missing"""
+        with mock.patch('requests.Session.send',
+                        return_value=status_response(503)) as send:
+            self.assertEqual(self.scheduler.fetch(BASE_URL), None)
+        self.assertEqual(send.call_count, 3)
+
+    def test_thread_priority(self):
+        """Test the background context sets the thread priority"""
+        with throttle.background():
+            self.assertEqual(throttle.current_priority(), throttle.BACKGROUND)
+        self.assertEqual(throttle.current_priority(), throttle.INTERACTIVE)
+
+class TestSingleFlight(unittest.TestCase):
+
+    def slow_response(self, request, **kwargs):
+        time.sleep(0.05)
+        return fixture_response(request, **kwargs)
+
+    def test_shared_call(self):
+        """Test concurrent callers of one key share a single call"""
+        flight = SingleFlight()
+        calls = []
+        results = []
+
+        def work():
+            calls.append(1)
+            time.sleep(0.05)
+            return 'page'
+
+        threads = [threading.Thread(target=lambda: results.append(flight.do('key', work)))
+                   for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['page'] * 4)
+        self.assertEqual(flight.in_flight(), 0)
+
+    def test_shared_chart(self):
+        """Test concurrent charts for one day download the page once"""
+        chart_cache.clear()
+        charts = {}
+
+        def build(show):
+            charts[show] = Cable('July 25 2017', show=show)
+
+        with mock.patch('requests.Session.send', side_effect=self.slow_response) as send:
+            threads = [threading.Thread(target=build, args=(show,))
+                       for show in ['Rick and Morty', 'Teen Mom']]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(send.call_count, 1)
+        self.assertEqual(charts['Teen Mom'][0].net, 'MTV')
+        self.assertEqual(charts['Rick and Morty'][0].net, 'ADSM')
+
+class TestChartCache(unittest.TestCase):
+
+    def setUp(self):
+        chart_cache.clear()
+        with offline() as self.send:
+            self.ratings = Broadcast('July 25 2017')
+            self.cbs = Broadcast('July 25 2017', network='CBS')
+
+    def test_fetched_once(self):
+        """Test repeated queries for one day reuse the cached chart"""
+        self.assertEqual(self.send.call_count, 1)
+        self.assertEqual(len(self.cbs), 1)
+        self.assertEqual(len(chart_cache), 1)
+
+    def test_filter_view(self):
+        """Test filtered views share entries with the full chart"""
+        view = self.ratings.filter(network='ABC', limit=1)
+        self.assertEqual(len(view), 1)
+        self.assertTrue(view[0] is self.ratings[1])
+        self.assertEqual(len(self.ratings), 4)
+
+class TestImportTime(unittest.TestCase):
+
+    def run_python(self, code):
+        output = subprocess.check_output([sys.executable, '-c', code])
+        return output.decode('utf-8').strip()
+
+    def test_lazy_dependencies(self):
+        """Test importing py_zap does not import the network and parse libraries"""
+        loaded = self.run_python(
+            'import sys, py_zap; '
+            'print(",".join(m for m in ["requests", "bs4", "json", "calendar"] '
+            'if m in sys.modules))')
+        self.assertEqual(loaded, '')
+
+    def test_import_time(self):
+        """Benchmark importing py_zap in a fresh interpreter"""
+        elapsed = float(self.run_python(
+            'import time; start = time.perf_counter(); import py_zap; '
+            'print(time.perf_counter() - start)'))
+        self.assertLess(elapsed, 0.5)
+
+    def test_yesterday_per_call(self):
+        """Test yesterday's date is computed on each call"""
+        from py_zap import constants
+        with mock.patch('py_zap.utils.datetime') as dt:
+            dt.today.return_value = datetime(2017, 7, 26)
+            self.assertEqual(u.yesterday(), 'July 25 2017')
+        self.assertEqual(u.get_date_info()[0], u.yesterday())
+        self.assertEqual(constants.YESTERDAY, u.yesterday())
+
+class TestFromHtml(unittest.TestCase):
+
+    def test_cable_from_html(self):
+        """Test a downloaded cable page is parsed without the network"""
+        ratings = Cable.from_html(CABLE_PAGE, 'July 25 2017', network='MTV')
+        self.assertEqual(len(ratings), 1)
+        self.assertEqual(len(ratings.chart), 3)
+        self.assertEqual(ratings[0].viewers, 1.023)
+
+    def test_wrong_date(self):
+        """Test a page for another date raises PageNotFoundError"""
+        self.assertRaises(u.PageNotFoundError, Broadcast.from_html,
+                          FINAL_PAGE, 'July 26 2017')
+
+
+class TestRender(unittest.TestCase):
+
+    def setUp(self):
+        self.cable = Cable.from_html(CABLE_PAGE, 'July 25 2017')
+        self.final = Broadcast.from_html(FINAL_PAGE, 'July 25 2017')
+
+    def test_cable_table(self):
+        """Test the cable table layout"""
+        lines = repr(self.cable).splitlines()
+        self.assertEqual(lines[0], 'Cable Ratings for Tuesday, July 25 2017')
+        self.assertEqual(lines[1], '|Show                          |Time      '
+                                   '|Network         |Viewers|Rating |')
+        self.assertEqual(lines[3], '|Rick and Morty                |  11:30 PM'
+                                   '|            ADSM|   1.51|    0.9|')
+        self.assertEqual(len(lines), 6)
+
+    def test_broadcast_entry(self):
+        """Test a broadcast row includes the share"""
+        self.assertEqual(repr(self.final[1]), '|Bachelor in Paradise          '
+                         '|    8 p.m.|    ABC|   4.92|    1.3|    5.0|')
+
+    def test_partial_row(self):
+        """Test a row with text in a number column ends before that column"""
+        final = Broadcast.from_html(FINAL_PAGE.replace('11.52', 'n/a'), 'July 25 2017')
+        self.assertEqual(repr(final[0]), '|America\'s Got Talent          '
+                         '|    8 p.m.|    NBC|')
+        self.assertEqual(repr(final).splitlines()[3], repr(final[0]))
+        self.assertEqual(len(repr(final).splitlines()), 7)
+
+    def test_write_charts(self):
+        """Test several charts are streamed with paged headers"""
+        stream = io.StringIO()
+        write_charts([self.cable, self.final], stream, page_size=2)
+        output = stream.getvalue()
+        self.assertTrue(output.startswith(repr(self.cable)[:200]))
+        self.assertEqual(output.count('|Show '), 4)
+        self.assertEqual(output.count('\n\n'), 1)
+
+class TestStreamingVerify(unittest.TestCase):
+
+    def setUp(self):
+        self.ratings = Cable.from_html(CABLE_PAGE, 'July 25 2017')
+
+    def stream_response(self, content):
+        response = requests.Response()
+        response.status_code = 200
+        response.raw = io.BytesIO(content)
+        response.raw.read = mock.Mock(side_effect=response.raw.read)
+        return response
+
+    def test_verify_head(self):
+        """Test the title is checked before the chart is downloaded"""
+        head = CABLE_PAGE[:CABLE_PAGE.index('<tr>')]
+        self.assertEqual(self.ratings._verify_head(head[:20]), None)
+        self.assertEqual(self.ratings._verify_head(head), True)
+        other_day = CABLE_PAGE.replace('July 25', 'July 24')
+        self.assertEqual(self.ratings._verify_head(other_day), False)
+
+    def test_split_title(self):
+        """Test a title split over several tags passes the streaming check"""
+        page = FINAL_PAGE.replace('July 25, 2017</b>', 'July 25,</b> <b>2017</b>')
+        self.assertEqual(Broadcast.from_html(page, 'July 25 2017').date, 'July 25 2017')
+
+        chart_cache.clear()
+        urls.url_knowledge.clear()
+        url = DAILY_URL.format('tuesday-final-ratings-july-25-2017')
+        with offline(), mock.patch.dict(FIXTURE_PAGES, {url: page}):
+            ratings = Broadcast('July 25 2017')
+        self.assertEqual(ratings.url, url)
+        self.assertFalse(urls.url_knowledge.is_missing(url))
+
+    def test_abort_download(self):
+        """Test a page with the wrong date stops downloading early"""
+        page = CABLE_PAGE.replace('July 25', 'July 24').encode('utf-8')
+        response = self.stream_response(page + b' ' * 1000000)
+        self.assertEqual(u.read_page(response, self.ratings._verify_head), None)
+        self.assertEqual(response.raw.read.call_count, 1)
+
+    def test_full_download(self):
+        """Test a page with the right date is read completely"""
+        page = CABLE_PAGE.encode('utf-8') + b' ' * 100000
+        response = self.stream_response(page)
+        self.assertEqual(u.read_page(response, self.ratings._verify_head), page)
+
+class TestUrlPlanner(unittest.TestCase):
+
+    def test_candidate_urls(self):
+        """Test both month spellings are candidates unless they are the same"""
+        self.assertEqual(urls.candidate_urls('final', u.convert_date('August 31 2017')), (
+            DAILY_URL.format('thursday-final-ratings-aug-31-2017'),
+            DAILY_URL.format('thursday-final-ratings-august-31-2017')))
+        self.assertEqual(urls.candidate_urls('final', u.convert_date('September 1 2017')), (
+            DAILY_URL.format('friday-final-ratings-sept-1-2017'),))
+
+    def test_fast_and_cable_urls(self):
+        """Test fast ratings switch url segments and cable spells out September"""
+        date_obj = u.convert_date('September 5 2017')
+        self.assertEqual(urls.candidate_urls('tv', date_obj), (
+            DAILY_URL.format('tv-ratings-tuesday-sept-5-2017'),))
+        self.assertEqual(urls.candidate_urls('cable', date_obj), (
+            DAILY_URL.format('tuesday-cable-ratings-september-5-2017'),))
+
+    def test_url_knowledge(self):
+        """Test missing urls are skipped and found urls are tried first"""
+        knowledge = urls.UrlKnowledge(missing_ttl=60)
+        knowledge.record('short', False)
+        knowledge.record('long', True)
+        self.assertEqual(knowledge.order(['short', 'other', 'long']), ['long', 'other'])
+
+        knowledge.missing_ttl = 0
+        time.sleep(0.01)
+        self.assertEqual(knowledge.order(['short']), ['short'])
+
+    def test_failed_request(self):
+        """Test only a 404 marks a url missing, not a failed request"""
+        chart_cache.clear()
+        urls.url_knowledge.clear()
+        url = DAILY_URL.format('tuesday-cable-ratings-july-25-2017')
+        responses = [status_response(503)] + [fixture_response] * 5
+
+        def send(request, **kwargs):
+            response = responses.pop(0)
+            return response if isinstance(response, requests.Response) else response(request)
+
+        throttle.configure(rate=None, retries=0)
+        try:
+            with mock.patch('requests.Session.send', side_effect=send):
+                self.assertRaises(u.PageNotFoundError, Cable, 'July 25 2017')
+                self.assertFalse(urls.url_knowledge.is_missing(url))
+                self.assertEqual(Cable('July 25 2017').url, url)
+        finally:
+            throttle.configure(rate=None)
+            urls.url_knowledge.clear()
+
+class TestNormalize(unittest.TestCase):
+
+    def test_typed_columns(self):
+        """Test only rating columns are converted to floats"""
+        row = normalize_row({'show': '24', 'net': 'FOX', 'time': '9 p.m.',
+                             'viewers': '5.31', 'rating': 'n/a'})
+        self.assertEqual(row['show'], '24')
+        self.assertEqual(row['viewers'], 5.31)
+        self.assertEqual(row['rating'], 'n/a')
+
+    def test_interned_networks(self):
+        """Test network names are shared between entries"""
+        ratings = Cable.from_html(CABLE_PAGE, 'July 25 2017')
+        net = ''.join(['M', 'TV'])
+        self.assertTrue(normalize_row({'net': net})['net'] is ratings[1].net)
+        self.assertTrue(type(ratings[0].show) is str)
+
+    def test_show_key(self):
+        """Test show name variants share a canonical key"""
+        self.assertEqual(show_key(u'Grey’s Anatomy'), 'greys anatomy')
+        self.assertEqual(show_key("Grey's Anatomy"), show_key('greys anatomy'))
+        self.assertEqual(show_key(u'The Big Bang Theory'), 'big bang theory')
+        self.assertEqual(show_key(u'Jane the Virgin: Café'), 'jane virgin cafe')
+
+class TestNetworkAverages(unittest.TestCase):
+
+    def setUp(self):
+        chart_cache.clear()
+
+    def test_compact_averages(self):
+        """Test averages are extracted while parsing the chart"""
+        ratings = Broadcast.from_html(FINAL_PAGE, 'July 25 2017')
+        self.assertEqual(len(ratings.network_averages), 5)
+        self.assertEqual(ratings.network_averages[1],
+                         ('ABC', 4.31, 1.1, 4.0))
+        self.assertEqual(ratings.get_averages()['CW'],
+                         {'viewer': 1.05, 'rating': 0.3, 'share': 1.0})
+
+    def test_average_range(self):
+        """Test network averages are aggregated over a range of days"""
+        with offline(), mock.patch.object(requests.Session, 'close') as close:
+            averages = average_range('July 25 2017', 'August 1 2017')
+        self.assertEqual(close.call_count, 1)
+        self.assertEqual(averages['NBC']['days'], 2)
+        self.assertEqual(averages['NBC']['viewers'], {'mean': 8.94, 'median': 8.94})
+        self.assertEqual(averages['FOX']['share']['mean'], 4.0)
+
+        # Only the entries of each day are kept
+        self.assertEqual(chart_cache.get(('final', 'July 25 2017')).html, None)
+
+class TestRetention(unittest.TestCase):
+
+    def setUp(self):
+        chart_cache.clear()
+
+    def test_lean_entries(self):
+        """Test entries, averages and title survive dropping the page"""
+        soup = Broadcast.from_html(FINAL_PAGE, 'July 25 2017')
+        lean = Broadcast.from_html(FINAL_PAGE, 'July 25 2017', retain='none')
+        self.assertEqual(lean.soup, None)
+        self.assertEqual(lean.get_json(), soup.get_json())
+        self.assertEqual(lean.network_averages, soup.network_averages)
+        self.assertEqual(lean.get_title(), soup.get_title())
+        self.assertEqual(repr(lean), repr(soup))
+
+    def test_compressed_page(self):
+        """Test the compressed page is parsed again when the soup is used"""
+        ratings = Cable.from_html(CABLE_PAGE, 'July 25 2017', retain='html')
+        self.assertEqual(ratings._soup, None)
+        self.assertEqual(len(ratings.soup.find_all('tr')), 4)
+
+    def test_cached_soup_chart(self):
+        """Test 'html' objects keep the page of a chart cached with its soup"""
+        with offline():
+            Cable('July 25 2017')
+            ratings = Cable('July 25 2017', retain='html')
+        self.assertEqual(ratings._soup, None)
+        self.assertEqual(len(ratings.soup.find_all('tr')), 4)
+
+    def test_lean_cache(self):
+        """Test the chart cache keeps no soup and 'soup' objects parse again"""
+        with offline():
+            parsed = Cable('July 25 2017')
+            cached = Cable('July 25 2017')
+        self.assertFalse(parsed._soup is None)
+        self.assertFalse('soup' in chart_cache.get(('cable', 'July 25 2017'))._fields)
+
+        self.assertEqual(cached._soup, None)
+        soup = cached.soup
+        self.assertEqual(len(soup.find_all('tr')), 4)
+        self.assertTrue(cached.soup is soup)
+
+    def test_footprint(self):
+        """Test lean policies keep less memory than the parsed page"""
+        soup = measure_memory(FINAL_PAGE, 'final', 'July 25 2017', 'soup')
+        html = measure_memory(FINAL_PAGE, 'final', 'July 25 2017', 'html')
+        lean = measure_memory(FINAL_PAGE, 'final', 'July 25 2017', 'none')
+        self.assertTrue(lean < html < soup)
+
+    def test_invalid_policy(self):
+        """Test an unknown retention policy raises ValueError"""
+        self.assertRaises(ValueError, Cable.from_html, CABLE_PAGE,
+                          'July 25 2017', retain='page')
+        with offline():
+            self.assertRaises(ValueError, Cable, 'July 25 2017', retain='page')
+            self.assertRaises(ValueError, Broadcast, 'July 25 2017', retain='page')
+
+def add_pages(path, number):
+    """Add pages to an archive from another process"""
+    archive = PageArchive(path)
+    for page in range(50):
+        url = 'http://example.com/%d/%d' % (number, page)
+        archive.add(url, url * 50)
+
+class TestPageArchive(unittest.TestCase):
+
+    def setUp(self):
+        chart_cache.clear()
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'pages.pack')
+
+    def tearDown(self):
+        u.set_page_cache(None)
+        shutil.rmtree(self.directory)
+
+    def test_reopen(self):
+        """Test archived pages are found by date after reopening the pack"""
+        with PageArchive(self.path) as archive:
+            for url, page in FIXTURE_PAGES.items():
+                archive.set(url, page)
+
+        with PageArchive(self.path) as archive:
+            self.assertEqual(len(archive), 4)
+            self.assertEqual(archive.dates('final'), ['July 25 2017', 'August 1 2017'])
+            self.assertEqual(archive.get_page('cable', 'july 25, 2017'),
+                             CABLE_PAGE.encode('utf-8'))
+            ratings = archive.ratings('final', 'July 25 2017')
+        self.assertEqual(ratings.url, DAILY_URL.format('tuesday-final-ratings-july-25-2017'))
+        self.assertEqual(repr(ratings), repr(Broadcast.from_html(FINAL_PAGE, 'July 25 2017')))
+
+    def test_zero_copy_reads(self):
+        """Test pages are read through views of the map, which survive it growing"""
+        with PageArchive(self.path) as archive:
+            archive.add('http://a/', CABLE_PAGE)
+            record = archive._pages['http://a/']
+            view = archive._read(record['offset'], record['length'])
+            self.assertTrue(isinstance(view, memoryview))
+
+            archive.add('http://b/', FINAL_PAGE)
+            self.assertEqual(archive.get('http://b/'), FINAL_PAGE.encode('utf-8'))
+            self.assertEqual(len(view), record['length'])
+            view.release()
+            self.assertEqual(archive.get('http://a/'), CABLE_PAGE.encode('utf-8'))
+
+    def test_iter_ratings(self):
+        """Test a range of days is parsed from the archive without the network"""
+        with offline():
+            u.set_page_cache(PageArchive(self.path))
+            Broadcast('July 25 2017')
+            Broadcast('August 1 2017')
+
+        archive = PageArchive(self.path)
+        days = list(archive.iter_ratings('final', 'July 20 2017', 'August 5 2017'))
+        self.assertEqual([ratings.date for ratings in days],
+                         ['July 25 2017', 'August 1 2017'])
+        self.assertRaises(u.PageNotFoundError, archive.ratings, 'cable', 'July 25 2017')
+
+    def test_partial_write(self):
+        """Test pages cut short in the pack are left out of the index"""
+        archive = PageArchive(self.path)
+        archive.add('http://example.com/a', CABLE_PAGE, 'cable', 'July 25 2017')
+        archive.add('http://example.com/b', FINAL_PAGE, 'final', 'July 25 2017')
+        with open(self.path, 'r+b') as f:
+            f.truncate(os.path.getsize(self.path) - 1)
+
+        archive = PageArchive(self.path)
+        self.assertTrue('http://example.com/a' in archive)
+        self.assertFalse('http://example.com/b' in archive)
+
+    def test_process_writers(self):
+        """Test processes appending to one archive keep every page readable"""
+        import multiprocessing
+
+        processes = [multiprocessing.Process(target=add_pages, args=(self.path, number))
+                     for number in range(4)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+
+        archive = PageArchive(self.path)
+        self.assertEqual(len(archive), 200)
+        for url in archive.urls():
+            self.assertEqual(archive.get(url), url.encode('utf-8') * 50)
+
+    def test_parse_url(self):
+        """Test the category and date are read from ratings page urls"""
+        self.assertEqual(urls.parse_url(DAILY_URL.format('tv-ratings-tuesday-sept-5-2017')),
+                         ('tv', 'September 5 2017'))
+        self.assertEqual(urls.parse_url(BASE_URL + '/?s=cable'), None)
+
+class TestStandInServer(unittest.TestCase):
+
+    def setUp(self):
+        chart_cache.clear()
+        urls.url_knowledge.clear()
+
+    def tearDown(self):
+        chart_cache.clear()
+        urls.url_knowledge.clear()
+
+    def test_recorded_pages(self):
+        """Test charts are fetched from the stand-in at the site url shapes"""
+        with StandInServer(FIXTURE_PAGES) as server:
+            ratings = Cable('July 25 2017')
+            self.assertEqual(ratings.url, server.url +
+                             '/daily-ratings/tuesday-cable-ratings-july-25-2017/')
+            self.assertEqual(len(ratings), 3)
+            wrong = server.url + '/daily-ratings/tuesday-cable-ratings-jul-25-2017/'
+            self.assertEqual(requests.get(wrong).status_code, 404)
+        self.assertEqual(urls.get_base_url(), BASE_URL)
+
+        # Charts of the stand-in are not used once it stopped
+        with offline():
+            self.assertEqual(Cable('July 25 2017').url,
+                             DAILY_URL.format('tuesday-cable-ratings-july-25-2017'))
+
+    def test_fresh_charts(self):
+        """Test charts cached before the stand-in started are fetched from it"""
+        with offline():
+            Cable('July 25 2017')
+        with StandInServer(FIXTURE_PAGES) as server:
+            self.assertTrue(Cable('July 25 2017').url.startswith(server.url))
+            self.assertEqual(server.requests, 1)
+
+    def test_search_page(self):
+        """Test the search fallback finds recorded pages"""
+        with StandInServer(FIXTURE_PAGES) as server:
+            search = SearchDaily('final', 'July 25 2017')
+            self.assertTrue(search.get_url().startswith(server.url))
+            self.assertEqual(len(search.fetch_result().find_all('tr')),
+                             len(BeautifulSoup(FINAL_PAGE, 'html.parser').find_all('tr')))
+
+    def test_injected_failures(self):
+        """Test latency and errors are injected into responses"""
+        with StandInServer(FIXTURE_PAGES, latency=0.05, error_rate=1,
+                           retry_after=0) as server:
+            start = time.time()
+            response = requests.get(server.url + '/daily-ratings/')
+            self.assertTrue(time.time() - start >= 0.05)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers['Retry-After'], '0')
+        self.assertEqual(server.statuses, {503: 1})
+
+    @mock.patch.dict(os.environ, {'PY_ZAP_BASE_URL': 'http://localhost:8000/'})
+    def test_base_url_variable(self):
+        """Test urls are built on the base url environment variable"""
+        date_obj = u.get_date_info('July 25 2017')[1]
+        self.assertEqual(urls.build_url('final', date_obj),
+                         'http://localhost:8000/daily-ratings/tuesday-final-ratings-july-25-2017/')
+
+class TestShowIndex(unittest.TestCase):
+
+    def setUp(self):
+        chart_cache.clear()
+        self.directory = tempfile.mkdtemp()
+        self.archive = PageArchive(os.path.join(self.directory, 'pages.pack'))
+        for url, page in FIXTURE_PAGES.items():
+            self.archive.set(url, page)
+        self.path = self.archive.path + '.shows'
+
+    def tearDown(self):
+        self.archive.close()
+        shutil.rmtree(self.directory)
+
+    def test_find(self):
+        """Test lookups find the same rows as filtering each chart"""
+        index = ShowIndex()
+        self.assertEqual(index.update(self.archive), 4)
+
+        airings = index.find('where', category='final')
+        ratings = Broadcast.from_html(FINAL_PAGE, 'July 25 2017', show='where')
+        self.assertEqual([airing.show for airing in airings],
+                         [entry.show for entry in ratings] * 2)
+        self.assertEqual(airings[0].offset, 3)
+        self.assertEqual(index.find_dates(network='nbc'), ['July 25 2017', 'August 1 2017'])
+        self.assertEqual(index.find_dates(['rick morty', 'ncis'], end='July 31 2017'),
+                         ['July 25 2017'])
+        self.assertEqual(index.find('ncis', network='abc'), [])
+
+    def test_persistence(self):
+        """Test the index is reloaded and only new days are ingested"""
+        index = ShowIndex(self.path)
+        index.ingest(Cable.from_html(CABLE_PAGE, 'July 25 2017'))
+        index.ingest(Cable.from_html(CABLE_PAGE, 'July 25 2017', limit=1))
+
+        index = ShowIndex(self.path)
+        self.assertTrue(('cable', 'july 25, 2017') in index)
+        self.assertEqual(index.update(self.archive), 3)
+        self.assertEqual(len(index.find(category='cable')), 3)
+
+class TestRowDiagnostics(unittest.TestCase):
+
+    def setUp(self):
+        chart_cache.clear()
+
+    def test_cable_row(self):
+        """Test a malformed cable row is reported without failing the chart"""
+        page = CABLE_PAGE.replace(
+            '<tr><td>Teen Mom 2',
+            '<tr><td>Broken Show</td><td>TBS</td><td>10:00 PM</td></tr><tr><td>Teen Mom 2')
+        ratings = Cable.from_html(page, 'July 25 2017')
+        self.assertEqual([entry.show for entry in ratings],
+                         ['Rick and Morty', 'Teen Mom 2', 'Tucker Carlson Tonight'])
+        self.assertEqual(len(ratings.diagnostics), 1)
+        self.assertEqual(ratings.diagnostics[0].index, 1)
+        self.assertEqual(ratings.diagnostics[0].text, 'Broken Show TBS 10:00 PM')
+
+    def test_broadcast_row(self):
+        """Test the time slot carries over a broadcast row that failed"""
+        page = FINAL_PAGE.replace('<td>Bachelor in Paradise (ABC)</td>',
+                                  '<td><a>Bachelor</a> in Paradise (ABC)</td>')
+        ratings = Broadcast.from_html(page, 'July 25 2017')
+        self.assertEqual(len(ratings), 3)
+        self.assertTrue('AttributeError' in ratings.diagnostics[0].error)
+        self.assertEqual(ratings.entries[0].time, '8 p.m.')
+        self.assertEqual(len(ratings.network_averages), 5)
+
+    def test_rows_per_second(self):
+        """Test bench reports the row parsing throughput"""
+        timings = time_stages(FINAL_PAGE, 'final', 'July 25 2017', repeat=2)
+        self.assertEqual(timings['rows'], [4, 4])
+        self.assertTrue(rows_per_second(timings) > 0)
+        self.assertTrue('rows/sec' in format_timings(timings))
+
+    def test_verify_every_run(self):
+        """Test each run detects the template and reads the title again"""
+        detect = mock.patch.object(layouts, 'detect', wraps=layouts.detect)
+        strings = mock.patch('py_zap.py_zap.get_title_strings',
+                             wraps=get_title_strings)
+        with detect as detect_mock, strings as strings_mock:
+            time_stages(FINAL_PAGE, 'final', 'July 25 2017', repeat=3)
+            # Loading the page detects once and reads the title twice,
+            # then each run does both once
+            self.assertEqual(detect_mock.call_count, 4)
+            self.assertEqual(strings_mock.call_count, 5)
+
+class TestLayout(unittest.TestCase):
+
+    def setUp(self):
+        chart_cache.clear()
+        layouts.clear()
+
+    def tearDown(self):
+        layouts.clear()
+
+    def test_cached_layout(self):
+        """Test each page template is detected once and shared"""
+        first = Cable.from_html(CABLE_PAGE, 'July 25 2017')
+        second = Cable.from_html(CABLE_PAGE, 'July 25 2017', show='rick')
+        self.assertTrue(first.layout.known)
+        self.assertTrue(first.layout is second.layout)
+        self.assertEqual(len(layouts), 1)
+
+    def test_reordered_columns(self):
+        """Test a template with other column positions is read by its header"""
+        page = re.sub(r'<tr><td>(.*?)</td><td>(.*?)</td><td>(.*?)</td>',
+                      r'<tr><td>\3</td><td>\1</td><td>\2</td>', CABLE_PAGE)
+        ratings = Cable.from_html(page, 'July 25 2017')
+        self.assertEqual(ratings.layout.order, (1, 2, 0, 3, 4))
+        self.assertEqual(ratings.get_json(),
+                         Cable.from_html(CABLE_PAGE, 'July 25 2017').get_json())
+
+    def test_no_averages(self):
+        """Test broadcast pages without network averages keep every row"""
+        page = FAST_PAGE.replace(BROADCAST_AVERAGES, '')
+        ratings = Broadcast.from_html(page, 'July 25 2017', final=False)
+        self.assertEqual(ratings.layout.tail_rows, 0)
+        self.assertEqual(len(ratings), 3)
+
+    def test_title_region(self):
+        """Test only the page before the chart is part of the template"""
+        page = CABLE_PAGE.replace('</body>', '<p><b>Note</b> <strong>Ad</strong></p></body>')
+        first = Cable.from_html(CABLE_PAGE, 'July 25 2017')
+        second = Cable.from_html(page, 'July 25 2017')
+        self.assertTrue(first.layout is second.layout)
+        self.assertEqual(second.get_title(), first.get_title())
+
+    def test_averages_by_position(self):
+        """Test known templates read the averages table by its rows"""
+        page = re.sub(r' (width|style)="[^"]*"', '', FINAL_PAGE)
+        ratings = Broadcast.from_html(page, 'July 25 2017')
+        self.assertTrue(ratings.layout.known)
+        self.assertEqual(ratings.network_averages,
+                         Broadcast.from_html(FINAL_PAGE, 'July 25 2017').network_averages)
+        self.assertEqual(len(ratings), 4)
+
+    def test_unknown_layout(self):
+        """Test unknown templates are flagged and read the default way"""
+        page = CABLE_PAGE.replace('<td>Net</td>', '<td>Channel</td>')
+        ratings = Cable.from_html(page, 'July 25 2017')
+        self.assertFalse(ratings.layout.known)
+        self.assertEqual(list(layouts.unknown), [ratings.layout.fingerprint])
+        self.assertEqual(len(ratings), 3)
+
+class TestBackfillQueue(unittest.TestCase):
+
+    def setUp(self):
+        chart_cache.clear()
+        urls.url_knowledge.clear()
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'queue.db')
+
+    def tearDown(self):
+        urls.url_knowledge.clear()
+        shutil.rmtree(self.directory)
+
+    def test_claim_order(self):
+        """Test tasks are added once and claimed in date order"""
+        queue = BackfillQueue(self.path)
+        self.assertEqual(queue.add(['final', 'cable'], 'July 24 2017', 'July 25 2017'), 4)
+        self.assertEqual(queue.add('cable', 'July 25 2017'), 0)
+
+        task = queue.claim('worker')
+        self.assertEqual(task, ('cable', 'July 24 2017', 1))
+        queue.complete(task, 3)
+
+        # A second queue on the same file sees the checkpoint
+        progress = BackfillQueue(self.path).progress()
+        self.assertEqual((progress.total, progress.done, progress.pending), (4, 1, 3))
+        self.assertEqual(queue.claim('worker'), ('final', 'July 24 2017', 1))
+
+    def test_retries(self):
+        """Test failed tasks back off, then fail once out of attempts"""
+        queue = BackfillQueue(self.path, retries=2, backoff=0.05)
+        queue.add('cable', 'July 25 2017')
+
+        queue.fail(queue.claim(), 'timeout')
+        self.assertEqual(queue.claim(), None)
+
+        time.sleep(0.06)
+        queue.fail(queue.claim(), 'timeout')
+        self.assertEqual(queue.progress().failed, 1)
+        self.assertEqual(queue.errors(), [('cable', 'July 25 2017', 'timeout')])
+
+        self.assertEqual(queue.retry_failed(), 1)
+        self.assertEqual(queue.claim().attempts, 1)
+
+    def test_expired_lease(self):
+        """Test tasks of workers that stopped are claimed again"""
+        queue = BackfillQueue(self.path, lease=0)
+        queue.add('final', 'July 25 2017')
+        first = queue.claim('crashed')
+        self.assertEqual(queue.claim('worker'), first._replace(attempts=2))
+
+    def test_recent_rate(self):
+        """Test the rate only counts tasks finished within the window"""
+        import sqlite3
+
+        queue = BackfillQueue(self.path, window=60)
+        queue.add('cable', 'July 24 2017', 'July 27 2017')
+        for _ in range(3):
+            queue.complete(queue.claim())
+
+        # Two tasks were done an hour ago, before the backfill was stopped
+        now = time.time()
+        db = sqlite3.connect(self.path)
+        db.execute("UPDATE tasks SET claimed_at = ?, finished_at = ? WHERE day < ?",
+                   (now - 3600, now - 3590, datetime(2017, 7, 26).toordinal()))
+        db.execute("UPDATE tasks SET claimed_at = ?, finished_at = ? "
+                   "WHERE date = 'July 26 2017'", (now - 10, now - 5))
+        db.commit()
+
+        progress = queue.progress()
+        self.assertAlmostEqual(progress.rate, 0.1, places=2)
+        self.assertAlmostEqual(progress.eta, 10, places=0)
+
+        db.execute("UPDATE tasks SET finished_at = ? WHERE date = 'July 26 2017'",
+                   (now - 120,))
+        db.commit()
+        db.close()
+        self.assertEqual(queue.progress().rate, None)
+
+    def test_expired_last_attempt(self):
+        """Test a task that keeps stopping its worker fails once out of attempts"""
+        queue = BackfillQueue(self.path, lease=0, retries=2)
+        queue.add('final', 'July 25 2017')
+        queue.claim('crashed')
+        queue.claim('crashed')
+        self.assertEqual(queue.claim('worker'), None)
+        self.assertEqual(queue.errors(), [('final', 'July 25 2017', 'lease expired')])
+
+    def test_worker_error(self):
+        """Test any error of a task fails the task, not the worker"""
+        queue = BackfillQueue(self.path, retries=1)
+        queue.add('cable', 'July 25 2017')
+        index = mock.Mock()
+        index.ingest.side_effect = OSError('disk full')
+
+        with offline():
+            self.assertEqual(run_worker(queue, index=index), 0)
+        self.assertEqual(queue.errors(), [('cable', 'July 25 2017', "OSError('disk full')")])
+
+    def test_run_worker(self):
+        """Test a worker fetches every task and records missing days"""
+        queue = BackfillQueue(self.path, retries=1)
+        queue.add(['cable', 'final'], 'July 25 2017', 'July 26 2017')
+        index = ShowIndex()
+
+        with offline():
+            self.assertEqual(run_worker(queue, index=index), 2)
+        progress = queue.progress()
+        self.assertEqual((progress.done, progress.failed), (2, 2))
+        self.assertEqual(index.find_dates('ncis'), ['July 25 2017'])
+
+class TestCommandLine(unittest.TestCase):
+
+    def setUp(self):
+        chart_cache.clear()
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        u.set_page_cache(None)
+        shutil.rmtree(self.directory)
+
+    def run_cli(self, argv):
+        stdout = io.StringIO()
+        with offline(), mock.patch('sys.stdout', stdout):
+            status = cli.main(argv)
+        return status, stdout.getvalue()
+
+    def test_fetch_ndjson(self):
+        """Test fetch writes one JSON line per entry of every found day"""
+        status, output = self.run_cli([
+            'fetch', '--category', 'cable', 'final', '--from', 'July 24 2017',
+            '--to', 'July 25 2017', '--workers', '2'])
+        rows = [json.loads(line) for line in output.splitlines()]
+        self.assertEqual(status, 0)
+        self.assertEqual(len(rows), 7)
+        self.assertEqual(set(row['date'] for row in rows), set(['July 25 2017']))
+
+    def test_fetch_csv_cache(self):
+        """Test fetch writes CSV and stores the pages in the cache"""
+        status, output = self.run_cli([
+            'fetch', '--category', 'cable', '--from', 'July 25 2017',
+            '--format', 'csv', '--cache', self.directory])
+        lines = output.splitlines()
+        self.assertEqual(lines[0], ','.join(cli.FIELDS))
+        self.assertEqual(len(lines), 4)
+        self.assertTrue(DAILY_URL.format('tuesday-cable-ratings-july-25-2017')
+                        in PageCache(self.directory))
+
+    def test_fetch_window(self):
+        """Test fetch only keeps a few charts in flight and no pages"""
+        with offline():
+            self.assertEqual(cli.fetch_day('cable', 'July 25 2017').soup, None)
+
+        started, written = [], []
+
+        def fetch_day(category, date, *args):
+            started.append(date)
+            return date
+
+        def entry_rows(ratings):
+            written.append(len(started))
+            return []
+
+        with mock.patch('py_zap.cli.fetch_day', fetch_day), \
+                mock.patch('py_zap.cli.entry_rows', entry_rows):
+            self.run_cli(['fetch', '--category', 'cable', '--from', 'July 1 2017',
+                          '--to', 'July 10 2017', '--workers', '1'])
+        self.assertEqual(len(written), 10)
+        for count, submitted in enumerate(written, 1):
+            self.assertTrue(submitted <= count + 1)
+
+    def test_backfill(self):
+        """Test backfill works through the queue and reports its status"""
+        path = os.path.join(self.directory, 'queue.db')
+        with mock.patch('sys.stderr', io.StringIO()):
+            status, _ = self.run_cli([
+                'backfill', path, '--category', 'cable', '--from', 'July 25 2017',
+                '--workers', '2'])
+            self.assertEqual(status, 0)
+            status, output = self.run_cli(['backfill', path, '--status'])
+        self.assertTrue(output.startswith('1/1 done, 0 failed'))
+
+    def test_backfill_worker_error(self):
+        """Test backfill reports workers that stopped on an error"""
+        path = os.path.join(self.directory, 'queue.db')
+        stderr = io.StringIO()
+        with mock.patch('sys.stderr', stderr), \
+                mock.patch('py_zap.backfill.run_worker', side_effect=OSError('disk full')):
+            status, _ = self.run_cli(['backfill', path, '--workers', '1'])
+        self.assertEqual(status, 1)
+        self.assertTrue("Worker stopped: OSError('disk full')" in stderr.getvalue())
+
+    def test_bench(self):
+        """Test bench times every stage on a recorded page"""
+        path = os.path.join(self.directory, 'final.html')
+        with open(path, 'w') as f:
+            f.write(FINAL_PAGE)
+        status, output = self.run_cli([
+            'bench', '--category', 'final', '--date', 'July 25 2017',
+            '--repeat', '2', path])
+        self.assertEqual(status, 0)
+        self.assertTrue('|entries   |       2|' in output)
+
 class TestUtils(unittest.TestCase):
 
     def test_convert_string(self):
@@ -195,6 +1313,12 @@ class TestUtils(unittest.TestCase):
         date2 = 'July 28 2017'
         self.assertTrue(u.date_in_range(date1, date2, 5))
 
+    def test_date_range(self):
+        """Test a range of date strings is inclusive of both ends"""
+        dates = u.date_range('July 30 2017', 'August 2 2017')
+        self.assertEqual(dates, ['July 30 2017', 'July 31 2017',
+                                 'August 1 2017', 'August 2 2017'])
+
     def test_date_not_in_range(self):
         """Test two date strings are not within specific range span"""
         date1 = 'July 25 2017'